@@ -2,88 +2,245 @@
 ## Dateiname: lmevolution.py (Selbstverbesserung)
 # LMS Evolution Modul
 
-import json
-import difflib
+import time
+import queue
 import logging
+import threading
 from pathlib import Path
 from datetime import datetime
-import re
+from lmsstore import LMSEvolutionStore
+from lmsmanifest import LMSManifest
+from lmsscore import LMSScorer
 
 class LMEvolution:
+    # Analysen warten höchstens in dieser Menge, sonst werden sie verworfen
+    QUEUE_SIZE = 64
+    # Optimierung einmal pro Lauf (bzw. alle WINDOW Dateien) nach dem Mittel der Bewertungen
+    SCORE_THRESHOLD = 50
+    WINDOW = 200
+    MIN_SCORES = 10
+    # Mindestabstand zweier automatischer Optimierungen in Sekunden
+    DEBOUNCE = 120
+    # Umfang des Berichts an das Modell
+    WORST_DIFFS = 3
+    DIFF_LINES = 40
+    PATTERN_SAMPLE = 200
+
     def __init__(self, plugin):
         self.plugin = plugin
         self.evolution_dir = Path("evolution_data")
         self.evolution_dir.mkdir(exist_ok=True)
+        # Indizierte Ablage statt einer JSON-Datei pro Analyse
+        self.store = LMSEvolutionStore(self.evolution_dir)
+        # Myers-Diff auf Zeilen-Hashes, große Dateien in eigenen Prozessen
+        self.scorer = LMSScorer()
+        # Eigene Stufe: die API-Worker reihen nur ein und warten nie auf die Analyse
+        self.analysis_queue = queue.Queue(maxsize=self.QUEUE_SIZE)
+        self.dropped = 0
+        # Bewertungen seit Laufbeginn bzw. seit der letzten Optimierung
+        self.scores = []
+        self._window_start = datetime.now().isoformat()
+        self._last_optimization = 0.0
+        self._optimizing = threading.Lock()
+        self._optimizer = None
+        self.worker = threading.Thread(target=self._process_analyses, name="lmevolution", daemon=True)
+        self.worker.start()
         logging.info("Evolution module initialized")
 
-    def _get_safe_filename(self, timestamp):
-        """Convert timestamp to safe filename"""
-        return re.sub(r'[^\w\-.]', '_', timestamp)
+    def start_run(self):
+        """Start collecting scores for a new run"""
+        self.analysis_queue.put({'action': 'start'})
+
+    def finish_run(self):
+        """Optimize from the run's scores once all of its analyses are stored"""
+        self.analysis_queue.put({'action': 'finish'})
+
+    def submit(self, result):
+        """Queue a result for analysis without blocking the caller"""
+        try:
+            self.analysis_queue.put_nowait({'action': 'analyze', 'result': result})
+            return True
+        except queue.Full:
+            # Die Selbstverbesserung darf die Verarbeitung nie bremsen
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 100 == 0:
+                logging.warning(f"Evolution queue full, {self.dropped} analyses skipped")
+            return False
+
+    def _process_analyses(self):
+        while True:
+            task = self.analysis_queue.get()
+            if task['action'] == 'shutdown':
+                break
+            if task['action'] == 'analyze':
+                self.analyze_result(task['result'])
+                self._check_scores(final=False)
+            elif task['action'] == 'start':
+                self.scores = []
+                self._window_start = datetime.now().isoformat()
+            elif task['action'] == 'finish':
+                self._check_scores(final=True)
 
     def analyze_result(self, result):
         """Analyze processing results with complete argument handling"""
         try:
             if not all(key in result for key in ['file_path', 'original', 'processed']):
                 raise ValueError("Invalid result format")
-            
-            diff = self._calculate_diff(result['original'], result['processed'])
-            score = self._score_changes(diff)
-            
+
+            # Große Dateien werden im Prozesspool bewertet
+            scored = self.scorer.submit(result['original'], result['processed']).result()
+            score = scored['score']
+            if scored['sampled']:
+                logging.info(f"Score of {result['file_path']} estimated from a sample")
+
             # Pass all required arguments including the current prompt
             self._save_analysis(
                 file_path=result['file_path'],
-                diff=diff,
+                diff=scored['diff'],
                 score=score,
-                prompt=self.plugin.current_prompt  # Added this argument
+                prompt=self.plugin.current_prompt,
+                scored=scored
             )
-            
-            if score < 50 and getattr(self.plugin.gui, 'auto_optimize', False):
-                self._optimize_prompt()
-                
+            self.scores.append(score)
+
         except Exception as e:
             error_msg = f"Analysis failed: {str(e)}"
             logging.error(error_msg)
             self.plugin.gui.show_error(error_msg)
 
-    def _calculate_diff(self, original, processed):
-        """Generate unified diff"""
-        return list(difflib.unified_diff(
-            original.splitlines(),
-            processed.splitlines(),
-            fromfile='original',
-            tofile='processed'
-        ))
-
-    def _score_changes(self, diff):
-        """Score changes based on rules"""
-        added = sum(1 for line in diff if line.startswith('+') and '#' in line)
-        modified = sum(1 for line in diff if line.startswith('-') and not line.startswith('-#'))
-        return added - (modified * 10)
-
-    def _save_analysis(self, file_path, diff, score, prompt):
+    def _check_scores(self, final):
+        """Start one optimization for a run (or a full window) with a low mean score"""
+        if not getattr(self.plugin.gui, 'auto_optimize', False) or len(self.scores) < self.MIN_SCORES:
+            return
+        if not final and len(self.scores) < self.WINDOW:
+            return
+        mean = sum(self.scores) / len(self.scores)
+        if mean >= self.SCORE_THRESHOLD or time.monotonic() - self._last_optimization < self.DEBOUNCE:
+            return
+        logging.info(f"Mean score {mean:.1f} of {len(self.scores)} files, optimizing prompt")
+        since = self._window_start
+        self._last_optimization = time.monotonic()
+        # Bewertungen des alten Prompts nicht für den neuen mitzählen
+        self.scores = []
+        self._window_start = datetime.now().isoformat()
+        self._optimizer = threading.Thread(target=self.optimize_prompt, args=(since,), daemon=True)
+        self._optimizer.start()
+
+    def optimize_prompt(self, since=None):
+        """Run one prompt optimization, skipped while another one is running"""
+        if not self._optimizing.acquire(blocking=False):
+            logging.info("Prompt optimization already running")
+            return
+        try:
+            self._optimize_prompt(since)
+        finally:
+            self._optimizing.release()
+
+    def aggregate(self, prompt, since=None):
+        """Score distribution, failure patterns and worst diffs of a prompt since a timestamp"""
+        prompt_hash = LMSManifest.prompt_hash(prompt)
+        scores = sorted(
+            entry['score'] for entry in self.store.history(prompt_hash=prompt_hash, since=since, limit=None)
+        )
+        report = {'prompt_hash': prompt_hash, 'since': since, 'count': len(scores)}
+        if not scores:
+            return report
+        report.update(
+            mean=sum(scores) / len(scores),
+            median=scores[len(scores) // 2],
+            min=scores[0],
+            max=scores[-1],
+            below_threshold=sum(1 for score in scores if score < self.SCORE_THRESHOLD)
+        )
+
+        # Muster aus den gezählten Zeilen der schlechtesten Ergebnisse; stark umgeschriebene
+        # Dateien werden ohne Diff bewertet (multiset/sampled), ihr leerer Diff heißt nichts
+        lowest = self.store.history(prompt_hash=prompt_hash, since=since, limit=self.PATTERN_SAMPLE,
+                                    with_diff=True, lowest_first=True)
+        patterns = {'removed_code': 0, 'removed_lines': 0, 'no_comments': 0, 'unchanged': 0}
+        for entry in lowest:
+            counts = self._line_counts(entry)
+            if counts is None:
+                continue
+            added, removed = counts
+            if not added and not removed and entry['score'] == 0:
+                patterns['unchanged'] += 1
+                continue
+            if removed:
+                patterns['removed_code'] += 1
+                patterns['removed_lines'] += removed
+            if not added:
+                patterns['no_comments'] += 1
+        report['patterns'] = patterns
+        report['sampled'] = len(lowest)
+        report['worst'] = [
+            {'file': entry['file'], 'score': entry['score'], 'method': entry['method'],
+             'added': entry['added'], 'removed': entry['removed'],
+             'diff': entry['diff'][:self.DIFF_LINES]}
+            for entry in lowest[:self.WORST_DIFFS]
+        ]
+        jobs = self.plugin.jobs.summary()
+        report['failed_files'] = jobs['failed']
+        return report
+
+    @staticmethod
+    def _line_counts(entry):
+        """Added comment and removed code lines of a stored analysis, None if unknown"""
+        if entry['removed'] is not None:
+            return entry['added'] or 0, entry['removed']
+        # Ältere Einträge ohne Zählung: aus dem gespeicherten Diff ableiten
+        changes = [line for line in entry['diff'] if line[:3] not in ('---', '+++')]
+        if not changes and entry['score'] != 0:
+            # Ohne Diff bewertet, die Zählung ist nicht mehr bekannt
+            return None
+        return (
+            sum(1 for line in changes if line.startswith('+') and '#' in line),
+            sum(1 for line in changes if line.startswith('-') and not line.startswith('-#'))
+        )
+
+    def _format_report(self, report):
+        """Feedback text for the optimization request"""
+        if not report['count']:
+            return None
+        patterns = report['patterns']
+        lines = [
+            f"Results of this prompt on {report['count']} files: mean score {report['mean']:.1f}, "
+            f"median {report['median']}, min {report['min']}, max {report['max']}, "
+            f"{report['below_threshold']} below {self.SCORE_THRESHOLD}.",
+            "Scoring: +1 per added comment line, -10 per removed or changed code line, "
+            "every changed file starts at -10.",
+            f"Among the {report['sampled']} lowest scoring files:",
+            f"- {patterns['removed_code']} lost code ({patterns['removed_lines']} lines removed or changed)",
+            f"- {patterns['no_comments']} got no new comments",
+            f"- {patterns['unchanged']} were returned unchanged",
+            f"{report['failed_files']} files could not be processed.",
+            "Lowest scoring changes:"
+        ]
+        for entry in report['worst']:
+            lines.append(f"File {entry['file']} (score {entry['score']}):")
+            if entry['diff']:
+                lines.extend(entry['diff'])
+            elif entry['removed'] is not None:
+                lines.append(
+                    f"(rewritten too heavily for a diff: {entry['removed']} code lines removed or changed, "
+                    f"{entry['added']} comment lines added)"
+                )
+        return "\n".join(lines)
+
+    def _save_analysis(self, file_path, diff, score, prompt, scored=None):
         """Save analysis data with all required parameters"""
         try:
-            timestamp = datetime.now().isoformat()
-            safe_timestamp = re.sub(r'[^\w\-.]', '_', timestamp)
-            filename = f"analysis_{safe_timestamp}.json"
-            
-            data = {
-                "file": str(file_path),
-                "timestamp": timestamp,
-                "score": score,
-                "diff": diff,
-                "prompt": prompt  # Now properly included
-            }
-            
-            with open(self.evolution_dir / filename, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-                
-            logging.info(f"Saved analysis: {filename}")
+            scored = scored or {}
+            prompt_hash = self.store.record(
+                file_path, score, prompt, diff,
+                added=scored.get('added_comments'), removed=scored.get('removed'), method=scored.get('method')
+            )
+            logging.info(f"Saved analysis: {file_path} (score {score}, prompt {prompt_hash[:12]})")
         except Exception as e:
             logging.error(f"Failed to save analysis: {str(e)}")
             raise
 
-    def _optimize_prompt(self):
+    def _optimize_prompt(self, since=None):
         """Optimize prompt using AI with proper response handling"""
         try:
             if not self.plugin.current_prompt:
@@ -95,8 +252,11 @@ class LMEvolution:
                 'negative': self.plugin.current_prompt.get('negative', '')
             }
             
-            # Call API for optimization
-            optimized = self.plugin.api_handler.optimize_prompt(current_prompt)
+            # Eine Anfrage mit den gesammelten Ergebnissen statt einer pro Datei
+            report = self.aggregate(current_prompt, since)
+            optimized = self.plugin.api_handler.optimize_prompt(
+                current_prompt, feedback=self._format_report(report)
+            )
             
             # Validate and parse API response
             if not isinstance(optimized, dict):
@@ -115,8 +275,13 @@ class LMEvolution:
                 positive=optimized['positive'],
                 negative=optimized['negative']
             )
-            
-            logging.info(f"Prompt optimized and saved as {name}")
+            # Abstammung und Ergebnisse der Vorgängerversion festhalten
+            self.store.record_optimization(current_prompt, optimized, name, report)
+
+            logging.info(
+                f"Prompt optimized and saved as {name} "
+                f"(from {report['count']} analyses of {report['prompt_hash'][:12]})"
+            )
             self.plugin.gui.update_status(f"New prompt saved: {name}")
             
         except ValueError as e:
@@ -126,4 +291,15 @@ class LMEvolution:
         except Exception as e:
             error_msg = f"Optimization failed: {str(e)}"
             logging.error(error_msg)
-            self.plugin.gui.show_error(error_msg)
\ No newline at end of file
+            self.plugin.gui.show_error(error_msg)
+
+    def stop(self):
+        """Finish queued analyses, stop the scoring pool and close the evolution store"""
+        self.analysis_queue.put({'action': 'shutdown'})
+        self.worker.join()
+        # Eine laufende Optimierung abschließen, ihr Ergebnis wäre sonst verloren
+        if self._optimizer:
+            self._optimizer.join()
+        self.scorer.stop()
+        self.store.close()
+        logging.info("Evolution module stopped")
@@ -6,33 +6,212 @@ import json
 import queue
 import threading
 import logging
+import time
+from pathlib import Path
 from urllib.parse import urljoin
+from lmscache import LMSResponseCache
+from lmschunk import LMSChunker, LMSChunkJob
+from lmstoken import LMSTokenCounter
+from lmsjobs import LMSJobTracker
+from lmsretry import LMSRetryPolicy
+from lmspool import LMSEndpointPool
+from lmshttp import LMSAbortableAdapter, abort_requests
 
 class LMSAPIHandler:
-    def __init__(self, plugin):
+    DEFAULT_URL = "http://localhost:1234/v1/"
+    # Gleichzeitig laufende Anfragen pro Server (Obergrenze)
+    MAX_WORKERS = 4
+    # Eingelesene Dateien pro Worker, die auf einen freien Worker warten dürfen
+    QUEUE_DEPTH = 2
+    # HTTP-Status, mit denen der Server Überlast meldet
+    OVERLOAD_STATUS = {429, 503}
+    # Timeouts in Sekunden (Verbindungsaufbau / Antwort)
+    CONNECT_TIMEOUT = 5
+    READ_TIMEOUT = 60
+    OPTIMIZE_READ_TIMEOUT = 30
+    # Kontextgröße des Modells in Tokens (Prompt + Datei + Antwort)
+    CONTEXT_TOKENS = 8192
+
+    def __init__(self, plugin, max_workers=None, connect_timeout=None, read_timeout=None):
         self.plugin = plugin
-        self.base_url = "http://localhost:1234/v1/"
-        self.request_queue = queue.Queue()
+        self.max_workers = max(1, int(max_workers or self.MAX_WORKERS))
+        self.connect_timeout = connect_timeout or self.CONNECT_TIMEOUT
+        self.read_timeout = read_timeout or self.READ_TIMEOUT
+        self.optimize_read_timeout = self.OPTIMIZE_READ_TIMEOUT
+        # Antworten als Server-Sent-Events empfangen (Live-Fortschritt)
+        self.stream = False
+        # Modellparameter (model=None nutzt das in LM Studio geladene Modell)
+        self.model = None
+        self.temperature = 0.3
+        self.max_tokens = 4000
+        self.context_tokens = self.CONTEXT_TOKENS
+        self.cache = LMSResponseCache()
+        self.tokens = LMSTokenCounter()
+        # Zu große Dateien aufteilen statt sie abzulehnen
+        self.chunking = True
+        self.chunker = LMSChunker(count_tokens=self.tokens.count)
+        self.session = self._create_session()
+        # Server-Pool, jeder Server mit eigener adaptiver Parallelität und Schutzschalter
+        self.pool = LMSEndpointPool(self.session, [
+            LMSEndpointPool.parse(self.DEFAULT_URL, self.max_workers)
+        ])
+        # Begrenzt: ein voller Puffer bremst das Einlesen weiterer Dateien
+        self.request_queue = queue.Queue(maxsize=self.max_workers * self.QUEUE_DEPTH)
+        # Vorübergehende Fehler wiederholen
+        self.retry = LMSRetryPolicy()
         self.running = True
-        self.worker = threading.Thread(target=self._process_requests)
-        self.worker.start()
-        logging.info("API handler initialized")
+
+        # Abbruch: Aufgaben älterer Generationen werden verworfen
+        self._generation_lock = threading.Lock()
+        self._generation = 0
+        # Threads mit laufender Anfrage, ihre Verbindungen werden beim Abbruch geschlossen
+        self._active_threads = set()
+        self._active_lock = threading.Lock()
+        self._outage_reported = False
+
+        self.workers = []
+        self._add_workers(self.max_workers)
+        logging.info(f"API handler initialized with {self.max_workers} workers")
+
+    def _add_workers(self, count):
+        for _ in range(count):
+            worker = threading.Thread(target=self._process_requests, name=f"lmsapi-{len(self.workers)}")
+            self.workers.append(worker)
+            worker.start()
+
+    @property
+    def base_url(self):
+        return self.pool.endpoints[0].url
+
+    @base_url.setter
+    def base_url(self, url):
+        self.set_endpoints([url])
+
+    def set_endpoints(self, specs):
+        """Configure the server pool from 'URL' or 'URL#N' entries"""
+        endpoints = [LMSEndpointPool.parse(spec, self.max_workers) for spec in specs if spec.strip()]
+        if not endpoints:
+            raise ValueError("No endpoint given")
+        # Ein Worker pro möglicher gleichzeitiger Anfrage über alle Server
+        capacity = sum(endpoint.max_concurrency for endpoint in endpoints)
+        if capacity > len(self.workers):
+            self._add_workers(capacity - len(self.workers))
+        old = self.session
+        self.session = self._create_session(
+            hosts=len(endpoints), connections=max(e.max_concurrency for e in endpoints)
+        )
+        self.pool.session = self.session
+        self.pool.endpoints = endpoints
+        old.close()
+        logging.info(f"Endpoints: {', '.join(f'{e} (max {e.max_concurrency})' for e in endpoints)}")
+
+    def start_run(self):
+        """Refill the retry budget and (re)start endpoint health checks"""
+        self.retry.start_run()
+        # Ein Ausfall aus dem letzten Lauf soll den neuen nicht sofort scheitern lassen
+        self.pool.restart_outage()
+        self._outage_reported = False
+        self.pool.start_health_checks()
+
+    def _create_session(self, hosts=1, connections=None):
+        """Create keep-alive session with a connection pool sized to the workers"""
+        session = requests.Session()
+        # Ein Platz zusätzlich für Prompt-Optimierungen neben den Workern
+        adapter = LMSAbortableAdapter(pool_connections=hosts, pool_maxsize=(connections or self.max_workers) + 1)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update({
+            "Content-Type": "application/json",
+            "Connection": "keep-alive"
+        })
+        return session
 
     def process_content(self, data):
         """Add processing request to queue"""
-        self.request_queue.put({
-            'action': 'process',
-            'data': data
-        })
+        with self._generation_lock:
+            generation = self._generation
+
+        self.plugin.metrics.queued(data.get('file_path'))
+        chunks = self._plan_request(data)
+        if chunks is None:
+            self._report(generation, data.get('file_path'), None)
+            return
+
+        if len(chunks) == 1:
+            self.request_queue.put({
+                'action': 'process',
+                'generation': generation,
+                'data': data
+            })
+            return
+
+        # Große Dateien: Stücke parallel verarbeiten und danach zusammensetzen
+        logging.info(f"Split {data['file_path']} into {len(chunks)} chunks")
+        job = LMSChunkJob(data, chunks)
+        for index, chunk in enumerate(chunks):
+            self.request_queue.put({
+                'action': 'chunk',
+                'generation': generation,
+                'index': index,
+                'job': job,
+                'data': dict(data, content=chunk)
+            })
+
+    def complete(self, data):
+        """Process one request in the calling thread, without queue, chunking or write-back"""
+        chunks = self._plan_request(data)
+        if chunks is None:
+            return None
+        if len(chunks) > 1:
+            logging.warning(f"Too large for a single request: {data.get('file_path')}")
+            return None
+        return self._call_api(data, self._generation)
 
-    def optimize_prompt(self, prompt):
-        """Optimize prompt with proper response parsing"""
+    def _prompt_tokens(self, prompt):
+        """Tokens used by the prompt messages around the file content"""
+        return self.tokens.count_messages([
+            {"content": str(prompt.get('positive', ''))},
+            {"content": ""},
+            {"content": f"Constraints: {str(prompt.get('negative', ''))}"}
+        ])
+
+    def _plan_request(self, data):
+        """Check request size against the context budget before dispatch"""
+        prompt = data.get('prompt') if isinstance(data.get('prompt'), dict) else {}
+        content = str(data.get('content', ''))
+        budget = self.context_tokens - self.max_tokens - self._prompt_tokens(prompt)
+
+        error_msg = None
+        if budget <= 0:
+            error_msg = f"Prompt exceeds context budget of {self.context_tokens} tokens"
+        else:
+            content_tokens = self.tokens.count_content(data.get('file_path'), content)
+            if content_tokens > budget and not self.chunking:
+                error_msg = f"File exceeds context budget ({content_tokens} > {budget} tokens)"
+
+        if error_msg:
+            error_msg = f"{error_msg}: {data.get('file_path')}"
+            self.plugin.gui.show_error(error_msg)
+            logging.error(error_msg)
+            return None
+
+        suffix = Path(str(data.get('file_path', ''))).suffix.lower()
+        return self.chunker.split(content, suffix, max_tokens=budget, total_tokens=content_tokens)
+
+    def estimate_batch(self, file_count, content_tokens, prompt):
+        """Estimate prompt and total tokens for a batch of files"""
+        prompt_tokens = content_tokens + file_count * self._prompt_tokens(prompt or {})
+        # Antworten sind etwa so lang wie die Eingabedatei
+        return prompt_tokens, prompt_tokens + content_tokens
+
+    def optimize_prompt(self, prompt, feedback=None):
+        """Optimize prompt with proper response parsing, feedback describes its results so far"""
         try:
             if not isinstance(prompt, dict):
                 raise ValueError("Prompt must be a dictionary")
             
-            response = requests.post(
-                urljoin(self.base_url, "chat/completions"),
+            response = self.session.post(
+                urljoin(self.pool.best().url, "chat/completions"),
                 json={
                     "messages": [
                         {
@@ -41,13 +220,15 @@ class LMSAPIHandler:
                         },
                         {
                             "role": "user",
-                            "content": json.dumps(prompt)
+                            "content": json.dumps(prompt) + (
+                                f"\n\nResults of this prompt so far:\n{feedback}" if feedback else ""
+                            )
                         }
                     ],
                     "temperature": 0.5,
                     "max_tokens": 2000
                 },
-                timeout=30
+                timeout=(self.connect_timeout, self.optimize_read_timeout)
             )
             response.raise_for_status()
             
@@ -78,10 +259,77 @@ class LMSAPIHandler:
         while self.running:
             task = self.request_queue.get()
             if task['action'] == 'process':
-                self._call_api(task['data'])
+                result = None
+                if task['generation'] == self._generation:
+                    result = self._call_api(task['data'], task['generation'])
+                self._report(task['generation'], task['data'].get('file_path'), result)
+            elif task['action'] == 'chunk':
+                self._process_chunk(task)
+            self.request_queue.task_done()
+
+    def cancel(self):
+        """Drop queued requests and abort running requests"""
+        with self._generation_lock:
+            self._generation += 1
+
+        purged = 0
+        keep = []
+        while True:
+            try:
+                task = self.request_queue.get_nowait()
+            except queue.Empty:
+                break
+            if task['action'] == 'process':
+                self._report(task['generation'], task['data'].get('file_path'), None)
+                purged += 1
+            elif task['action'] == 'chunk':
+                self._process_chunk(task, skip=True)
+                purged += 1
+            else:
+                keep.append(task)
             self.request_queue.task_done()
+        for task in keep:
+            self.request_queue.put(task)
+
+        # Verbindungen laufender Anfragen schließen, auch vor dem Eintreffen der Antwort
+        with self._active_lock:
+            threads = list(self._active_threads)
+        aborted = abort_requests(threads)
+        logging.info(f"API requests cancelled: {purged} queued, {aborted} running aborted")
+
+    def _process_chunk(self, task, skip=False):
+        """Process one chunk and report the file once all chunks are done"""
+        job = task['job']
+        result = None
+        if not skip and task['generation'] == self._generation:
+            result = self._call_api(task['data'], task['generation'])
+        processed = result['processed'] if result else None
+        if not job.complete(task['index'], processed):
+            return
 
-    def _call_api(self, data):
+        if job.failed:
+            logging.error(f"Chunked processing failed: {job.data['file_path']}")
+            self._report(task['generation'], job.data['file_path'], None)
+            return
+        self._report(task['generation'], job.data['file_path'], {
+            'file_path': str(job.data['file_path']),
+            'original': str(job.data['content']),
+            'processed': job.stitch()
+        })
+
+    def _report(self, generation, file_path, result):
+        """Hand a finished request to the plugin as soon as it is done"""
+        # Keine Reihenfolge erzwingen: ein langsamer Request darf die übrigen nicht aufhalten,
+        # der Fortschritt zählt nur fertige Dateien (LMSJobTracker)
+        if generation != self._generation:
+            # Abgebrochener Lauf, die Datei wurde bereits als abgebrochen markiert
+            return
+        if result is not None:
+            self.plugin.process_ai_response(result)
+        else:
+            self.plugin.on_file_failed(file_path)
+
+    def _call_api(self, data, generation=None):
         """Call LMStudio API with comprehensive error handling"""
         try:
             # Validate input data structure
@@ -97,60 +345,250 @@ class LMSAPIHandler:
                 {"role": "system", "content": f"Constraints: {str(data['prompt']['negative'])}"}
             ]
 
-            # Prepare API request with timeout
-            request_data = {
-                "messages": messages,
-                "temperature": 0.3,
-                "max_tokens": 4000,
-                "stream": False
-            }
-
-            # Make API call
-            response = requests.post(
-                urljoin(self.base_url, "chat/completions"),
-                json=request_data,
-                timeout=60,
-                headers={"Content-Type": "application/json"}
+            # Unveränderte Dateien mit gleichem Prompt nicht erneut senden
+            cache_key = self.cache.make_key(
+                data['content'], data['prompt'], self.model, self.temperature, self.max_tokens
             )
-
-            # Check for HTTP errors
-            response.raise_for_status()
-
-            # Parse and validate response
-            result = response.json()
-            if 'choices' not in result or len(result['choices']) == 0:
-                raise ValueError("Invalid API response format")
+            content = self.cache.get(cache_key)
+            if content is None:
+                content = self._send_with_retry(messages, str(data['file_path']), generation)
+                self.cache.put(cache_key, content)
+            else:
+                self.plugin.jobs.set_state(data['file_path'], LMSJobTracker.CACHED)
+                self.plugin.metrics.dispatched(data['file_path'])
+                self.plugin.metrics.set(data['file_path'], cached=True)
+                logging.info(f"Cache hit: {data['file_path']}")
 
             # Prepare processed data with all required fields
             processed_data = {
                 'file_path': str(data['file_path']),
                 'original': str(data['content']),
-                'processed': str(result['choices'][0]['message']['content'])
+                'processed': str(content)
             }
 
-            # Send to plugin for processing
-            self.plugin.process_ai_response(processed_data)
+            return processed_data
 
         except requests.exceptions.RequestException as e:
-            error_msg = f"API connection error: {str(e)}"
-            self.plugin.gui.show_error(error_msg)
-            logging.error(error_msg)
+            self._api_error(f"API connection error: {str(e)}", generation)
         except json.JSONDecodeError as e:
-            error_msg = f"API response parsing failed: {str(e)}"
-            self.plugin.gui.show_error(error_msg)
-            logging.error(error_msg)
+            self._api_error(f"API response parsing failed: {str(e)}", generation)
         except KeyError as e:
-            error_msg = f"Missing expected data field: {str(e)}"
-            self.plugin.gui.show_error(error_msg)
-            logging.error(error_msg)
+            self._api_error(f"Missing expected data field: {str(e)}", generation)
         except Exception as e:
-            error_msg = f"Unexpected API error: {str(e)}"
-            self.plugin.gui.show_error(error_msg)
-            logging.error(error_msg)
+            self._api_error(f"Unexpected API error: {str(e)}", generation)
+        return None
+
+    def _api_error(self, error_msg, generation):
+        if generation is not None and generation != self._generation:
+            # Fehler durch Abbruch (geschlossener Stream) nicht melden
+            logging.info(f"Cancelled request ended: {error_msg}")
+            return
+        self.plugin.gui.show_error(error_msg)
+        logging.error(error_msg)
+
+    def _send_with_retry(self, messages, file_path, generation=None):
+        """Route to the least busy endpoint and retry transient failures"""
+        cancelled = lambda: generation is not None and generation != self._generation
+        attempt = 0
+        while True:
+            attempt += 1
+            if not self.pool.available() and self.retry.remaining <= 0:
+                # Kein Server erreichbar und keine Wiederholungen mehr übrig
+                raise requests.exceptions.ConnectionError("LM Studio unavailable (circuit open)")
+            # Wartet, solange alle Server ausgelastet oder gesperrt sind
+            endpoint = self.pool.acquire(cancelled)
+            if endpoint is None:
+                if cancelled():
+                    raise ValueError("Request cancelled")
+                self._report_outage()
+                raise requests.exceptions.ConnectionError(
+                    f"LM Studio unavailable for more than {self.pool.max_outage:.0f}s (circuit open)"
+                )
+            try:
+                content = self._timed_completion(endpoint, messages, file_path)
+            except Exception as e:
+                if cancelled():
+                    # Durch den Abbruch geschlossene Verbindung, kein Serverfehler
+                    endpoint.circuit.abort_probe()
+                elif self.retry.endpoint_down(e):
+                    if endpoint.circuit.record_failure():
+                        self.plugin.gui.update_status(
+                            f"{endpoint} unavailable, pausing requests for {endpoint.circuit.cooldown:.0f}s"
+                            + (f" (giving up after {self.pool.max_outage:.0f}s)" if self.pool.max_outage else "")
+                        )
+                        logging.warning(
+                            f"Circuit of {endpoint} opened after {endpoint.circuit.failures} failures: {str(e)}"
+                        )
+                else:
+                    # Der Server hat geantwortet, also ist er erreichbar
+                    self._circuit_success(endpoint)
+
+                delay = None if cancelled() else self.retry.next_delay(attempt, e)
+                if delay is None:
+                    raise
+                logging.warning(
+                    f"Retrying {file_path} in {delay:.1f}s "
+                    f"(attempt {attempt}/{self.retry.max_attempts}): {str(e)}"
+                )
+                deadline = time.monotonic() + delay
+                while not cancelled():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    time.sleep(min(0.25, remaining))
+                continue
+
+            self._circuit_success(endpoint)
+            return content
+
+    def _report_outage(self):
+        """Tell the user once per run that the remaining requests fail without waiting"""
+        with self._active_lock:
+            if self._outage_reported:
+                return
+            self._outage_reported = True
+        message = f"No endpoint available for {self.pool.outage():.0f}s, failing remaining requests"
+        self.plugin.gui.update_status(message)
+        logging.error(message)
+
+    def _circuit_success(self, endpoint):
+        if endpoint.circuit.record_success():
+            self.plugin.gui.update_status(f"{endpoint} available again, resuming requests")
+            logging.info(f"Circuit of {endpoint} closed")
+
+    def _timed_completion(self, endpoint, messages, file_path):
+        """Request a completion and feed the latency into the endpoint's limit"""
+        self.plugin.jobs.set_state(file_path, LMSJobTracker.IN_FLIGHT)
+        self.plugin.metrics.dispatched(file_path)
+        started = time.monotonic()
+        try:
+            content = self._request_completion(messages, file_path, endpoint.url)
+        except requests.exceptions.Timeout:
+            self.pool.release(endpoint, time.monotonic() - started, overloaded=True)
+            raise
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code in self.OVERLOAD_STATUS:
+                self.pool.release(endpoint, time.monotonic() - started, overloaded=True)
+            else:
+                self.pool.abandon(endpoint)
+            raise
+        except Exception:
+            # Andere Fehler (z.B. Abbruch) sagen nichts über die Serverlast
+            self.pool.abandon(endpoint)
+            raise
+        elapsed = time.monotonic() - started
+        self.pool.release(endpoint, elapsed, self.tokens.estimate(len(content)))
+        self.plugin.metrics.add(file_path, generation=elapsed)
+        return content
+
+    def _request_completion(self, messages, file_path, base_url=None):
+        """Send chat completion request and return the generated text"""
+        # Prepare API request with timeout
+        request_data = {
+            "messages": messages,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "stream": self.stream
+        }
+        if self.model:
+            request_data["model"] = self.model
+
+        # Make API call over the pooled keep-alive session
+        thread_id = threading.get_ident()
+        with self._active_lock:
+            self._active_threads.add(thread_id)
+        try:
+            sent = time.monotonic()
+            response = self.session.post(
+                urljoin(base_url or self.base_url, "chat/completions"),
+                json=request_data,
+                timeout=(self.connect_timeout, self.read_timeout),
+                stream=self.stream
+            )
+
+            # Check for HTTP errors
+            response.raise_for_status()
+
+            if self.stream:
+                content, usage = self._consume_stream(response, file_path, sent)
+            else:
+                # Parse and validate response
+                result = response.json()
+                if 'choices' not in result or len(result['choices']) == 0:
+                    raise ValueError("Invalid API response format")
+                content = str(result['choices'][0]['message']['content'])
+                usage = result.get('usage')
+        finally:
+            with self._active_lock:
+                self._active_threads.discard(thread_id)
+        self._record_usage(file_path, messages, content, usage)
+        return content
+
+    def _record_usage(self, file_path, messages, content, usage):
+        """Token counts from the response, estimated if the server sends no usage"""
+        if isinstance(usage, dict) and 'completion_tokens' in usage:
+            prompt_tokens = usage.get('prompt_tokens', 0)
+            completion_tokens = usage['completion_tokens']
+        else:
+            prompt_tokens = self.tokens.count_messages(messages)
+            completion_tokens = self.tokens.count(content)
+        self.plugin.metrics.add(
+            file_path, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens
+        )
+
+    def _consume_stream(self, response, file_path, sent):
+        """Collect streamed tokens and report partial output, returns text and usage"""
+        # text/event-stream ohne charset würde sonst als ISO-8859-1 dekodiert
+        response.encoding = 'utf-8'
+        parts = []
+        usage = None
+        started = time.monotonic()
+        finished = False
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                payload = line[len('data:'):].strip()
+                if payload == '[DONE]':
+                    finished = True
+                    break
+
+                event = json.loads(payload)
+                # Manche Server senden die Token-Zählung im letzten Ereignis mit
+                usage = event.get('usage') or usage
+                choices = event.get('choices') or []
+                if not choices:
+                    continue
+                if choices[0].get('finish_reason'):
+                    finished = True
+                delta = (choices[0].get('delta') or {}).get('content')
+                if delta:
+                    if not parts:
+                        self.plugin.metrics.first_token(file_path, time.monotonic() - sent)
+                    parts.append(delta)
+                    self.plugin.on_stream_progress(
+                        file_path, delta, len(parts), time.monotonic() - started
+                    )
+
+            # Ein abgebrochener Stream darf nicht als vollständige Antwort gelten
+            if not finished:
+                raise requests.exceptions.ChunkedEncodingError("Stream ended before completion")
+            if not parts:
+                raise ValueError("Empty streamed response")
+            return ''.join(parts), usage
+        except Exception:
+            self.plugin.discard_stream(file_path)
+            raise
+        finally:
+            response.close()
 
     def stop(self):
         """Stop API handler"""
         self.running = False
-        self.request_queue.put({'action': 'shutdown'})
-        self.worker.join()
-        logging.info("API handler stopped")
\ No newline at end of file
+        for _ in self.workers:
+            self.request_queue.put({'action': 'shutdown'})
+        for worker in self.workers:
+            worker.join()
+        self.pool.stop()
+        self.session.close()
+        logging.info("API handler stopped")
@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+## Dateiname: lmsbench.py (Benchmark)
+# Misst den Durchsatz der Pipeline gegen einen simulierten OpenAI-kompatiblen Server
+#
+# Beispiel: python lmsbench.py --files 500 --dist lognormal --latency 0.2 --token-rate 400
+#           python lmsbench.py --files 200 --stream --repeat 3 --results bench.jsonl
+#
+import os
+import sys
+import json
+import math
+import time
+import random
+import socket
+import logging
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+from pathlib import Path
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+class LMSMockHandler(BaseHTTPRequestHandler):
+    """Stand-in for LM Studio: echoes the user message as completion"""
+
+    # Wird von serve() gesetzt: latency, token_rate, error_rate
+    config = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/models'):
+            self._send_json(200, {'object': 'list', 'data': [{'id': 'mock-model', 'object': 'model'}]})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        if random.random() < self.config['error_rate']:
+            self._send_json(503, {'error': 'model is loading'})
+            return
+
+        messages = request.get('messages', [])
+        prompt = ''.join(str(m.get('content', '')) for m in messages)
+        content = next((m['content'] for m in messages if m.get('role') == 'user'), '')
+        # Etwa vier Zeichen pro Token, wie LMSTokenCounter.estimate
+        pieces = [content[i:i + 4] for i in range(0, len(content), 4)] or ['']
+        usage = {
+            'prompt_tokens': len(prompt) // 4 + 1,
+            'completion_tokens': len(pieces),
+            'total_tokens': len(prompt) // 4 + 1 + len(pieces)
+        }
+        delay = 1 / self.config['token_rate'] if self.config['token_rate'] > 0 else 0
+        time.sleep(self.config['latency'])
+
+        if not request.get('stream'):
+            time.sleep(delay * len(pieces))
+            self._send_json(200, {
+                'object': 'chat.completion',
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content},
+                             'finish_reason': 'stop'}],
+                'usage': usage
+            })
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        # In Blöcken von 16 Tokens senden, damit sleep() nicht die Messung dominiert
+        for start in range(0, len(pieces), 16):
+            block = pieces[start:start + 16]
+            time.sleep(delay * len(block))
+            event = {'choices': [{'index': 0, 'delta': {'content': ''.join(block)}}]}
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+        final = {'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}], 'usage': usage}
+        self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode('utf-8'))
+        self.wfile.flush()
+
+
+def serve(port, latency, token_rate, error_rate, seed=None):
+    """Run the mock server until the process is terminated"""
+    random.seed(seed)
+    LMSMockHandler.config = {'latency': latency, 'token_rate': token_rate, 'error_rate': error_rate}
+    server = ThreadingHTTPServer(('127.0.0.1', port), LMSMockHandler)
+    server.daemon_threads = True
+    server.serve_forever()
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Mock server did not start on port {port}")
+
+
+def file_sizes(count, dist, mean, rng):
+    """File sizes in bytes for the synthetic repository"""
+    if dist == 'fixed':
+        return [mean] * count
+    if dist == 'uniform':
+        return [rng.randint(1, 2 * mean) for _ in range(count)]
+    # Lognormal: viele kleine, wenige sehr große Dateien wie in echten Repositories
+    sigma = 1.0
+    mu = math.log(mean) - sigma ** 2 / 2
+    return [max(1, int(rng.lognormvariate(mu, sigma))) for _ in range(count)]
+
+
+def make_repository(root, count, dist, mean, dirs, rng):
+    """Write count Python files with the given size distribution below root"""
+    sizes = file_sizes(count, dist, mean, rng)
+    for index, size in enumerate(sizes):
+        directory = Path(root) / f"pkg{index % dirs}"
+        directory.mkdir(parents=True, exist_ok=True)
+        lines = []
+        written = 0
+        n = 0
+        while written < size:
+            line = f"value_{n} = {rng.randint(0, 10 ** 6)}  # synthetic line {n}\n"
+            lines.append(line)
+            written += len(line)
+            n += 1
+        (directory / f"module_{index}.py").write_text(''.join(lines)[:size] + "\n", encoding='utf-8')
+    return sizes
+
+
+def _peak_rss():
+    """Peak resident set size of this process in bytes (None if unavailable)"""
+    if sys.platform == 'win32':
+        return _peak_working_set()
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux meldet KiB, macOS Bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _peak_working_set():
+    """Windows has no resource module: PeakWorkingSetSize via GetProcessMemoryInfo"""
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [
+            ('cb', wintypes.DWORD),
+            ('PageFaultCount', wintypes.DWORD),
+            ('PeakWorkingSetSize', ctypes.c_size_t),
+            ('WorkingSetSize', ctypes.c_size_t),
+            ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+            ('PagefileUsage', ctypes.c_size_t),
+            ('PeakPagefileUsage', ctypes.c_size_t)
+        ]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    try:
+        kernel32 = ctypes.WinDLL('kernel32')
+        psapi = ctypes.WinDLL('psapi')
+    except OSError:
+        return None
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(ProcessMemoryCounters), wintypes.DWORD]
+    psapi.GetProcessMemoryInfo.restype = wintypes.BOOL
+    if not psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+        return None
+    return counters.PeakWorkingSetSize
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "-C", str(Path(__file__).resolve().parent), "describe", "--always", "--dirty"],
+            capture_output=True, check=True
+        ).stdout.decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_once(args, url, workdir):
+    """Process one synthetic repository and return the measurements"""
+    from lmstudioplug import LMStudioPlugin
+    from lmsreport import LMSReporter
+    from lmsmetrics import LMSMetrics
+
+    rng = random.Random(args.seed)
+    repo = Path(workdir) / "repo"
+    sizes = make_repository(repo, args.files, args.dist, args.mean_bytes, args.dirs, rng)
+
+    reporter = LMSReporter()
+    plugin = LMStudioPlugin(reporter=reporter, max_workers=args.workers)
+    try:
+        plugin.api_handler.set_endpoints([url])
+        plugin.api_handler.stream = args.stream
+        plugin.api_handler.cache.enabled = False
+        plugin.file_handler.file_queue.order = args.order
+        plugin.current_prompt = {'positive': "Return the file unchanged.", 'negative': ""}
+
+        started = time.monotonic()
+        plugin.start_processing(plugin.file_handler.walk(repo, with_size=True), str(repo), True)
+        reporter.completed.wait()
+        duration = time.monotonic() - started
+
+        records = list(plugin.metrics.files.values())
+        summary = plugin.jobs.summary()
+    finally:
+        plugin.stop()
+
+    # Latenz pro Datei: Lesen + Warten + Generierung
+    latencies = [
+        record.get('read', 0) + record.get('queue_wait', 0) + record.get('generation', 0)
+        for record in records if 'generation' in record
+    ]
+    completion = sum(record.get('completion_tokens', 0) for record in records)
+    return {
+        'files': args.files,
+        'bytes': sum(sizes),
+        'written': summary['written'],
+        'failed': summary['failed'],
+        'duration': round(duration, 3),
+        'files_per_second': round(summary['written'] / duration, 3),
+        'tokens_per_second': round(completion / duration, 1),
+        'latency_p50': LMSMetrics.quantile(latencies, 0.5),
+        'latency_p95': LMSMetrics.quantile(latencies, 0.95),
+        'latency_p99': LMSMetrics.quantile(latencies, 0.99),
+        'peak_rss': _peak_rss()
+    }
+
+
+def _run_child(args, url, workdir, log_path, conn):
+    """Run one measurement in a fresh process, so the peak RSS belongs to this run only"""
+    logging.basicConfig(
+        filename=log_path,
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    try:
+        # Cache, Journal, Metriken und Log landen im temporären Verzeichnis
+        os.chdir(workdir)
+        conn.send(('ok', run_once(args, url, workdir)))
+    except BaseException as e:
+        conn.send(('error', f"{type(e).__name__}: {str(e)}"))
+    finally:
+        conn.close()
+
+
+def _measure(args, url, workdir, log_path):
+    # spawn statt fork: ru_maxrss wird sonst vom Elternprozess übernommen
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    child = context.Process(target=_run_child, args=(args, url, workdir, log_path, sender))
+    child.start()
+    sender.close()
+    try:
+        status, result = receiver.recv()
+    except EOFError:
+        status, result = 'error', f"benchmark process exited with code {child.exitcode}"
+    child.join()
+    if status != 'ok':
+        raise RuntimeError(f"Benchmark run failed: {result}")
+    return result
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline against a mock LM Studio server")
+    parser.add_argument("--files", type=int, default=200, help="Files in the synthetic repository")
+    parser.add_argument("--dist", choices=("fixed", "uniform", "lognormal"), default="lognormal",
+                        help="File size distribution")
+    parser.add_argument("--mean-bytes", type=int, default=4000, help="Mean file size in bytes")
+    parser.add_argument("--dirs", type=int, default=4, help="Top-level directories to spread files over")
+    parser.add_argument("--latency", type=float, default=0.1, help="Server latency before the first token (s)")
+    parser.add_argument("--token-rate", type=float, default=500, help="Generated tokens per second and request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--order", choices=("sjf", "ljf", "fifo"), default="sjf")
+    parser.add_argument("--repeat", type=int, default=1, help="Number of runs")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for repository and error injection")
+    parser.add_argument("--results", help="Append results as JSON lines to this file")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    port = _free_port()
+    # Eigener Prozess, damit der Server den RSS-Wert der Pipeline nicht verfälscht
+    server = multiprocessing.Process(
+        target=serve, args=(port, args.latency, args.token_rate, args.error_rate, args.seed), daemon=True
+    )
+    server.start()
+    cwd = os.getcwd()
+    # Vor dem Plugin konfigurieren, sonst landet das Log im temporären Verzeichnis
+    logging.basicConfig(
+        filename=os.path.join(cwd, 'lmsbench.log'),
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    try:
+        _wait_for_port(port)
+        config = {k: v for k, v in vars(args).items() if k not in ('results', 'repeat')}
+        revision = _git_revision()
+        print(f"{'run':>3} {'files/s':>9} {'tok/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+              f"{'RSS MiB':>8} {'failed':>6}")
+        for run in range(1, args.repeat + 1):
+            with tempfile.TemporaryDirectory(prefix="lmsbench") as workdir:
+                # Jeder Lauf in einem eigenen Prozess, sonst misst RSS das Maximum aller Läufe
+                result = _measure(args, f"http://127.0.0.1:{port}/v1/", workdir,
+                                  os.path.join(cwd, 'lmsbench.log'))
+
+            def ms(value):
+                return f"{value * 1000:.0f}" if value is not None else "-"
+            rss = f"{result['peak_rss'] / 2 ** 20:.0f}" if result['peak_rss'] else "-"
+            print(f"{run:>3} {result['files_per_second']:>9.2f} {result['tokens_per_second']:>9.1f} "
+                  f"{ms(result['latency_p50']):>8} {ms(result['latency_p95']):>8} "
+                  f"{ms(result['latency_p99']):>8} {rss:>8} {result['failed']:>6}")
+
+            if args.results:
+                record = {'time': datetime.now().isoformat(), 'revision': revision, 'run': run,
+                          'config': config, **result}
+                with open(args.results, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record) + "\n")
+        return 0
+    finally:
+        server.terminate()
+        server.join()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+## Dateiname: lmscache.py (Antwort-Cache)
+# Persistenter Cache für Modellantworten, adressiert über den Inhalt der Anfrage
+#
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+class LMSResponseCache:
+    # Maximale Cachegröße in Bytes, danach werden die ältesten Einträge entfernt
+    MAX_SIZE = 256 * 1024 * 1024
+
+    def __init__(self, cache_dir="response_cache", max_size=None):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(exist_ok=True)
+        self.max_size = max_size or self.MAX_SIZE
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size, am längsten unbenutzt zuerst
+        self._total_size = 0
+        self._load_index()
+        logging.info(f"Response cache initialized with {len(self._entries)} entries")
+
+    @staticmethod
+    def make_key(content, prompt, model, temperature, max_tokens):
+        """Build cache key from file content, prompt and model parameters"""
+        payload = json.dumps({
+            'content': hashlib.sha256(str(content).encode('utf-8')).hexdigest(),
+            'positive': str(prompt.get('positive', '')),
+            'negative': str(prompt.get('negative', '')),
+            'model': model,
+            'temperature': temperature,
+            'max_tokens': max_tokens
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _load_index(self):
+        """Rebuild LRU order from the modification times on disk"""
+        found = []
+        for path in self.cache_dir.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            found.append((stat.st_mtime, path.stem, stat.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_size += size
+
+    def get(self, key):
+        """Return cached response or None"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)['processed']
+            os.utime(path)  # LRU-Reihenfolge über Neustarts erhalten
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Dropping unreadable cache entry {key}: {str(e)}")
+            self._remove(key)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Store response and evict least recently used entries"""
+        if not self.enabled:
+            return
+
+        path = self._path(key)
+        try:
+            path.parent.mkdir(exist_ok=True)
+            temp = path.with_suffix(f".{threading.get_ident()}.tmp")
+            with open(temp, 'w', encoding='utf-8') as f:
+                json.dump({'processed': value}, f, ensure_ascii=False)
+            os.replace(temp, path)
+            size = path.stat().st_size
+        except OSError as e:
+            logging.error(f"Failed to write cache entry {key}: {str(e)}")
+            return
+
+        with self._lock:
+            self._total_size += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            evicted = []
+            while self._total_size > self.max_size and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._total_size -= old_size
+                evicted.append(old_key)
+
+        for old_key in evicted:
+            self._path(old_key).unlink(missing_ok=True)
+
+    def _remove(self, key):
+        with self._lock:
+            self._total_size -= self._entries.pop(key, 0)
+        self._path(key).unlink(missing_ok=True)
+
+    def clear(self):
+        """Remove all cached responses"""
+        with self._lock:
+            keys = list(self._entries)
+            self._entries.clear()
+            self._total_size = 0
+        for key in keys:
+            self._path(key).unlink(missing_ok=True)
+        logging.info("Response cache cleared")
+
+    def stats(self):
+        """Return hit/miss counters and current size"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'size': self._total_size
+            }
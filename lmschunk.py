@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+## Dateiname: lmschunk.py (Aufteilung großer Dateien)
+# Teilt Dateien an syntaktischen Grenzen in Stücke, die in den Modellkontext passen
+#
+import ast
+import re
+import threading
+from lmstoken import LMSTokenCounter
+
+class LMSChunker:
+    # Token-Budget für den Dateiinhalt eines einzelnen Stücks
+    CHUNK_TOKENS = 3000
+    BRACE_EXTENSIONS = {
+        '.js', '.java', '.cpp', '.c', '.h',
+        '.cs', '.php', '.go', '.rs', '.ts'
+    }
+    # Zeichenketten und Zeilenkommentare beim Zählen von Klammern ignorieren
+    _BRACE_NOISE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|//.*$')
+
+    def __init__(self, max_tokens=None, count_tokens=None):
+        self.max_tokens = max_tokens or self.CHUNK_TOKENS
+        self.count_tokens = count_tokens or (lambda text: LMSTokenCounter.estimate(len(text)))
+
+    def split(self, content, suffix, max_tokens=None, total_tokens=None):
+        """Split content into token-budgeted chunks on syntactic boundaries"""
+        budget = max(1, min(max_tokens or self.max_tokens, self.max_tokens))
+        if total_tokens is None:
+            total_tokens = self.count_tokens(content)
+        if total_tokens <= budget:
+            return [content]
+
+        lines = content.splitlines(keepends=True)
+        if suffix == '.py':
+            starts = self._python_boundaries(content, lines)
+        elif suffix in self.BRACE_EXTENSIONS:
+            starts = self._brace_boundaries(lines)
+        else:
+            starts = self._indent_boundaries(lines)
+
+        starts = sorted(set(starts) | {0})
+        starts.append(len(lines))
+        segments = [''.join(lines[a:b]) for a, b in zip(starts, starts[1:]) if a < b]
+        return self._pack(segments, budget)
+
+    def _python_boundaries(self, content, lines):
+        """Top-level statements including decorators and leading comments"""
+        try:
+            tree = ast.parse(content)
+        except (SyntaxError, ValueError):
+            return self._indent_boundaries(lines)
+
+        starts = []
+        for node in tree.body:
+            start = node.lineno - 1
+            for decorator in getattr(node, 'decorator_list', []):
+                start = min(start, decorator.lineno - 1)
+            # Kommentarblöcke direkt vor einer Definition gehören zu ihr
+            while start > 0 and lines[start - 1].lstrip().startswith('#'):
+                start -= 1
+            starts.append(start)
+        return starts
+
+    def _brace_boundaries(self, lines):
+        """Lines following a point where the brace depth returns to zero"""
+        starts = []
+        depth = 0
+        for index, line in enumerate(lines):
+            code = self._BRACE_NOISE.sub('', line)
+            was_nested = depth > 0
+            depth = max(0, depth + code.count('{') - code.count('}'))
+            if was_nested and depth == 0:
+                starts.append(index + 1)
+        return starts
+
+    def _indent_boundaries(self, lines):
+        """Non-indented lines that do not close a previous block"""
+        return [
+            index for index, line in enumerate(lines)
+            if line.strip() and not line[0].isspace()
+            and not line.lstrip().startswith(('end', '}', ')', ']'))
+        ]
+
+    def _pack(self, segments, budget):
+        """Greedily merge segments into chunks within the token budget"""
+        chunks = []
+        current = []
+        current_tokens = 0
+        for segment in segments:
+            tokens = self.count_tokens(segment)
+            if tokens > budget:
+                if current:
+                    chunks.append(''.join(current))
+                    current, current_tokens = [], 0
+                chunks.extend(self._split_lines(segment, budget))
+                continue
+            if current and current_tokens + tokens > budget:
+                chunks.append(''.join(current))
+                current, current_tokens = [], 0
+            current.append(segment)
+            current_tokens += tokens
+        if current:
+            chunks.append(''.join(current))
+        return chunks
+
+    def _split_lines(self, segment, budget):
+        """Hard split of an oversized segment at line boundaries"""
+        chunks = []
+        current = []
+        current_tokens = 0
+        for line in segment.splitlines(keepends=True):
+            tokens = self.count_tokens(line)
+            if current and current_tokens + tokens > budget:
+                chunks.append(''.join(current))
+                current, current_tokens = [], 0
+            current.append(line)
+            current_tokens += tokens
+        if current:
+            chunks.append(''.join(current))
+        return chunks
+
+
+class LMSChunkJob:
+    """Collects the results of all chunks of one file"""
+
+    def __init__(self, data, chunks):
+        self.data = data
+        self.chunks = chunks
+        self.results = [None] * len(chunks)
+        self.failed = False
+        self._remaining = len(chunks)
+        self._lock = threading.Lock()
+
+    def complete(self, index, result):
+        """Store chunk result, returns True once every chunk has finished"""
+        with self._lock:
+            if result is None:
+                self.failed = True
+            else:
+                self.results[index] = result
+            self._remaining -= 1
+            return self._remaining == 0
+
+    def stitch(self):
+        """Join chunk results in their original order"""
+        parts = []
+        for chunk, result in zip(self.chunks, self.results):
+            if chunk.endswith('\n') and not result.endswith('\n'):
+                result += '\n'
+            parts.append(result)
+        return ''.join(parts)
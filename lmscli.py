@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+## Dateiname: lmscli.py (Kommandozeile / Batch-Betrieb)
+# Startet die Verarbeitung ohne Tkinter, z.B. auf Build-Agents
+#
+# Beispiel: python lmscli.py src/ --prompt python_docs --format jsonl
+#
+import sys
+import argparse
+import logging
+from pathlib import Path
+from lmstudioplug import LMStudioPlugin
+from lmsreport import ConsoleReporter, JSONLinesReporter
+from lmseval import LMSPromptEvaluator
+
+REPORTERS = {
+    'console': ConsoleReporter,
+    'jsonl': JSONLinesReporter
+}
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Process files with LM Studio without the GUI"
+    )
+    parser.add_argument("target", help="File or directory to process")
+    parser.add_argument("--prompt", help="Name of a saved prompt in prompts/")
+    parser.add_argument("--positive", help="Positive prompt text (instead of --prompt)")
+    parser.add_argument("--negative", default="", help="Negative prompt text")
+    parser.add_argument("--base-url", action="append",
+                        help="LM Studio API URL, e.g. http://localhost:1234/v1/ "
+                             "(repeat for several servers, append #N to limit concurrent requests)")
+    parser.add_argument("--model", help="Model name (default: model loaded in LM Studio)")
+    parser.add_argument("--workers", type=int, help="Maximum concurrent API requests per server")
+    parser.add_argument("--retries", type=int, help="Maximum attempts per request (default: 3)")
+    parser.add_argument("--max-outage", type=float,
+                        help="Seconds all servers may be down before queued files fail (default: 60, 0 = wait)")
+    parser.add_argument("--connect-timeout", type=float, help="Seconds to wait for a connection (default: 5)")
+    parser.add_argument("--read-timeout", type=float, help="Seconds to wait for the response (default: 60)")
+    parser.add_argument("--temperature", type=float)
+    parser.add_argument("--max-tokens", type=int)
+    parser.add_argument("--context-tokens", type=int)
+    parser.add_argument("--stream", action="store_true", help="Use streaming completions")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the response cache")
+    parser.add_argument("--incremental", action="store_true", help="Only process changed files")
+    parser.add_argument("--resume", action="store_true", help="Continue the last interrupted run (--output write only)")
+    parser.add_argument("--output", choices=("write", "patch", "git"), default="write")
+    parser.add_argument("--order", choices=("sjf", "ljf", "fifo"), default="sjf",
+                        help="Schedule small files first (sjf), large files first (ljf) or in scan order")
+    parser.add_argument("--auto-optimize", action="store_true", help="Optimize prompt on low scores")
+    parser.add_argument("--format", choices=sorted(REPORTERS), default="console")
+    parser.add_argument("--evaluate", action="append", metavar="PROMPT",
+                        help="Compare saved prompts on a sample of files instead of processing "
+                             "(repeat for each prompt, nothing is written)")
+    parser.add_argument("--sample", type=int, default=20, help="Files to sample for --evaluate")
+    parser.add_argument("--seed", type=int, help="Seed for the --evaluate sample")
+    return parser
+
+def _load_prompt(plugin, args):
+    if args.positive:
+        return {'positive': args.positive, 'negative': args.negative}
+    if args.prompt:
+        prompt = plugin.prompt_manager.load_prompt(args.prompt)
+        if prompt:
+            return {'positive': prompt['positive'], 'negative': prompt['negative']}
+    return None
+
+def _configure(plugin, args):
+    api = plugin.api_handler
+    if args.base_url:
+        api.set_endpoints(args.base_url)
+    if args.model:
+        api.model = args.model
+    if args.temperature is not None:
+        api.temperature = args.temperature
+    if args.max_tokens:
+        api.max_tokens = args.max_tokens
+    if args.context_tokens:
+        api.context_tokens = args.context_tokens
+    if args.retries:
+        api.retry.max_attempts = max(1, args.retries)
+    if args.max_outage is not None:
+        api.pool.max_outage = max(0.0, args.max_outage)
+    api.stream = args.stream
+    api.cache.enabled = not args.no_cache
+    plugin.incremental = args.incremental
+    plugin.resume = args.resume
+    plugin.writer.mode = args.output
+    plugin.file_handler.file_queue.order = args.order
+
+def _evaluate(plugin, reporter, args, target):
+    evaluator = LMSPromptEvaluator(plugin)
+    files = [str(target)] if target.is_file() else evaluator.sample_files(target, args.sample, args.seed)
+    try:
+        results = evaluator.evaluate(args.evaluate, files)
+    except ValueError as e:
+        reporter.show_error(str(e))
+        return 2
+    reporter.show_summary(evaluator.table(results), {'evaluation': results, 'files': files})
+    return 0
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    reporter = REPORTERS[args.format](auto_optimize=args.auto_optimize)
+    plugin = LMStudioPlugin(
+        reporter=reporter, max_workers=args.workers,
+        connect_timeout=args.connect_timeout, read_timeout=args.read_timeout
+    )
+    try:
+        _configure(plugin, args)
+        target = Path(args.target)
+        if not target.exists():
+            reporter.show_error(f"Target not found: {target}")
+            return 2
+        if args.evaluate:
+            return _evaluate(plugin, reporter, args, target)
+
+        plugin.current_prompt = _load_prompt(plugin, args)
+        if not plugin.current_prompt:
+            reporter.show_error("No prompt given (use --prompt NAME or --positive TEXT)")
+            return 2
+
+        if target.is_file():
+            plugin.start_processing([str(target)], str(target))
+        else:
+            plugin.start_processing(plugin.file_handler.walk(target, with_size=True), str(target), True)
+
+        # Mit Timeout warten, damit Strg+C auch unter Windows greift
+        while not reporter.completed.wait(0.5):
+            pass
+        return 1 if reporter.errors else 0
+    except KeyboardInterrupt:
+        logging.info("Batch run interrupted")
+        plugin.stop_processing()
+        return 130
+    finally:
+        plugin.stop()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+## Dateiname: lmseval.py (Prompt-Vergleich)
+# Bewertet mehrere gespeicherte Prompts auf derselben Stichprobe von Dateien
+#
+# Beispiel: python lmscli.py src/ --evaluate python_docs --evaluate optimized_20250101_120000 --sample 30
+#
+import time
+import random
+import logging
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+class LMSPromptEvaluator:
+    # Kennzahlen pro Prompt: Bewertung, Antwortzeit (ohne Cache-Treffer) und erzeugte Tokens
+    MEASURES = ('score', 'latency', 'tokens')
+
+    def __init__(self, plugin):
+        self.plugin = plugin
+        self.cancelled = False
+
+    def sample_files(self, target, count, seed=None):
+        """Uniform sample of count files below target (reservoir sampling over the lazy walk)"""
+        rng = random.Random(seed)
+        sample = []
+        for index, file_path in enumerate(self.plugin.file_handler.walk(target)):
+            if index < count:
+                sample.append(file_path)
+            else:
+                slot = rng.randint(0, index)
+                if slot < count:
+                    sample[slot] = file_path
+        return sorted(sample)
+
+    def _read(self, files):
+        contents = {}
+        for file_path in files:
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    contents[file_path] = f.read()
+            except (OSError, UnicodeDecodeError) as e:
+                logging.warning(f"Skipping {file_path} in evaluation: {str(e)}")
+        return contents
+
+    def evaluate(self, prompt_names, files):
+        """Run every prompt on every file concurrently, returns statistics per prompt"""
+        self.cancelled = False
+        prompts = {}
+        for name in prompt_names:
+            prompt = self.plugin.prompt_manager.load_prompt(name)
+            if prompt is None:
+                raise ValueError(f"Prompt not found: {name}")
+            prompts[name] = {'positive': prompt['positive'], 'negative': prompt['negative']}
+        contents = self._read(files)
+
+        # Eigene Messreihe, jede Kombination unter eigenem Namen
+        self.plugin.metrics.start_run()
+        api = self.plugin.api_handler
+        jobs = [(name, file_path) for name in prompts for file_path in contents]
+        logging.info(f"Evaluating {len(prompts)} prompts on {len(contents)} files")
+        # Die Server-Grenzen regeln die tatsächliche Parallelität
+        executor = ThreadPoolExecutor(max_workers=max(1, api.pool.capacity))
+        try:
+            futures = [
+                executor.submit(self._run_one, name, prompts[name], file_path, contents[file_path])
+                for name, file_path in jobs
+            ]
+            samples = [future.result() for future in futures]
+        except KeyboardInterrupt:
+            # Vor dem Warten auf den Pool abbrechen, sonst laufen alle Anfragen noch durch
+            self.cancel()
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+        executor.shutdown(wait=True)
+
+        results = {}
+        for name in prompts:
+            results[name] = self._statistics([s for s in samples if s['prompt'] == name])
+        return results
+
+    def _run_one(self, name, prompt, file_path, content):
+        """Process one prompt/file pair and score it"""
+        sample = {'prompt': name, 'file': file_path, 'ok': False}
+        if self.cancelled:
+            return sample
+        label = f"{name}:{file_path}"
+        started = time.monotonic()
+        result = self.plugin.api_handler.complete({'file_path': label, 'content': content, 'prompt': prompt})
+        elapsed = time.monotonic() - started
+        self.plugin.discard_stream(label)
+        if result is None:
+            return sample
+
+        record = self.plugin.metrics.files.get(label, {})
+        scored = self.plugin.evolution.scorer.submit(content, result['processed']).result()
+        sample.update(ok=True, score=scored['score'], cached=bool(record.get('cached')))
+        if not sample['cached']:
+            sample.update(latency=elapsed, tokens=record.get('completion_tokens', 0))
+        return sample
+
+    def _statistics(self, samples):
+        stats = {
+            'files': len(samples),
+            'failed': sum(1 for s in samples if not s['ok']),
+            'cached': sum(1 for s in samples if s.get('cached'))
+        }
+        for measure in self.MEASURES:
+            values = [s[measure] for s in samples if measure in s]
+            stats[measure] = {
+                'count': len(values),
+                'mean': statistics.mean(values) if values else None,
+                'variance': statistics.variance(values) if len(values) > 1 else 0.0 if values else None
+            }
+        return stats
+
+    def table(self, results):
+        """Plain text comparison, best mean score first"""
+        def value(stats, measure, key, scale=1, digits=1):
+            number = stats[measure][key]
+            return "-" if number is None else f"{number * scale:.{digits}f}"
+
+        lines = [f"{'Prompt':<32}{'files':>6}{'failed':>7}{'cached':>7}{'score':>9}{'var':>10}"
+                 f"{'ms':>8}{'var ms²':>12}{'tokens':>8}{'var':>10}"]
+        ranked = sorted(
+            results.items(),
+            key=lambda item: (item[1]['score']['mean'] is None, -(item[1]['score']['mean'] or 0))
+        )
+        for name, stats in ranked:
+            lines.append(
+                f"{name[:31]:<32}{stats['files']:>6}{stats['failed']:>7}{stats['cached']:>7}"
+                f"{value(stats, 'score', 'mean'):>9}{value(stats, 'score', 'variance'):>10}"
+                f"{value(stats, 'latency', 'mean', 1000, 0):>8}"
+                f"{value(stats, 'latency', 'variance', 10 ** 6, 0):>12}"
+                f"{value(stats, 'tokens', 'mean'):>8}{value(stats, 'tokens', 'variance'):>10}"
+            )
+        return "\n".join(lines)
+
+    def cancel(self):
+        self.cancelled = True
+        self.plugin.api_handler.cancel()
@@ -2,34 +2,125 @@
 ## Dateiname: lmsfile.py (Dateiverarbeitung)
 #
 import os
-import queue
+import time
+import fnmatch
 import threading
 import logging
 from pathlib import Path
+from lmsjobs import LMSJobTracker
+from lmsschedule import LMSScheduler
+
+class LMSIgnoreRules:
+    """Subset of .gitignore semantics: globs, negation, anchoring, dir-only"""
+
+    def __init__(self, rules=None):
+        self.rules = rules or []
+
+    def extend(self, directory):
+        """Return rules including the .gitignore of directory (if any)"""
+        path = os.path.join(directory, '.gitignore')
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return self
+
+        rules = list(self.rules)
+        for line in lines:
+            line = line.rstrip()
+            if not line or line.startswith('#'):
+                continue
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            anchored = '/' in line
+            rules.append((directory, line.lstrip('/'), negate, dir_only, anchored))
+        return LMSIgnoreRules(rules)
+
+    def ignored(self, path, name, is_dir):
+        """Check path against all rules, the last matching rule wins"""
+        result = False
+        for base, pattern, negate, dir_only, anchored in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if anchored:
+                target = os.path.relpath(path, base).replace(os.sep, '/')
+            else:
+                target = name
+            if fnmatch.fnmatchcase(target, pattern):
+                result = not negate
+        return result
+
 
 class LMSFileHandler:
     SUPPORTED_EXTENSIONS = {
         '.py', '.js', '.java', '.cpp', '.c', '.h', 
         '.cs', '.php', '.rb', '.go', '.rs', '.ts'
     }
+    # Verzeichnisse, die nie durchsucht werden
+    IGNORED_DIRS = {
+        '.git', '.hg', '.svn', 'node_modules', '__pycache__', '.venv', 'venv',
+        '.tox', '.mypy_cache', '.pytest_cache', 'build', 'dist', 'target', 'obj'
+    }
 
     def __init__(self, plugin):
         self.plugin = plugin
-        self.file_queue = queue.Queue()
+        # Nach geschätzten Tokens geordnet statt in Verzeichnisreihenfolge
+        self.file_queue = LMSScheduler()
         self.running = True
         self.worker = threading.Thread(target=self._process_queue)
         self.worker.start()
         logging.info("File handler initialized")
 
-    def process_file(self, file_path, prompt):
-        """Add file to processing queue"""
-        if not self._validate_file(file_path):
-            return
+    def process_file(self, file_path, prompt, validated=False, cost=0, group=None):
+        """Add file to processing queue, cost is the estimated token count"""
+        if self.plugin.cancel_event.is_set():
+            return False
+        if not validated and not self._validate_file(file_path):
+            return False
         self.file_queue.put({
             'action': 'process',
             'path': str(file_path),
             'prompt': prompt
-        })
+        }, cost=cost, group=group)
+        return True
+
+    def walk(self, root, with_size=False):
+        """Yield supported files below root while the tree is being scanned"""
+        # with_size=True liefert (Pfad, Größe) aus dem Verzeichniseintrag: Kosten schätzen ohne Lesen
+        stack = [(str(root), LMSIgnoreRules().extend(str(root)))]
+        while stack:
+            directory, rules = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    entries = sorted(entries, key=lambda e: e.name)
+            except OSError as e:
+                logging.warning(f"Cannot scan {directory}: {str(e)}")
+                continue
+
+            subdirs = []
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in self.IGNORED_DIRS and not rules.ignored(entry.path, entry.name, True):
+                            subdirs.append(entry.path)
+                    elif (os.path.splitext(entry.name)[1].lower() in self.SUPPORTED_EXTENSIONS
+                            and entry.is_file()
+                            and not rules.ignored(entry.path, entry.name, False)):
+                        yield (entry.path, entry.stat().st_size) if with_size else entry.path
+                except OSError:
+                    continue
+
+            # Umgekehrt auf den Stapel, damit die Reihenfolge alphabetisch bleibt
+            for subdir in reversed(subdirs):
+                stack.append((subdir, rules.extend(subdir)))
+
+    def cancel(self):
+        """Drop all queued files"""
+        purged = len(self.file_queue.drain())
+        logging.info(f"File queue cancelled: {purged} files dropped")
 
     def _process_queue(self):
         """Process files from queue"""
@@ -37,13 +128,19 @@ class LMSFileHandler:
             task = self.file_queue.get()
             if task['action'] == 'process':
                 self._handle_file(task['path'], task['prompt'])
-            self.file_queue.task_done()
 
     def _handle_file(self, file_path, prompt):
         """Process single file"""
+        if self.plugin.cancel_event.is_set():
+            # Vor dem Abbruch entnommen, aber noch nicht gelesen
+            self.plugin.on_file_failed(file_path)
+            return
+        self.plugin.jobs.set_state(file_path, LMSJobTracker.READING)
         try:
+            started = time.monotonic()
             with open(file_path, 'r', encoding='utf-8') as f:
                 content = f.read()
+            self.plugin.metrics.set(file_path, read=time.monotonic() - started)
             
             self.plugin.api_handler.process_content({
                 'file_path': file_path,
@@ -53,6 +150,7 @@ class LMSFileHandler:
         except Exception as e:
             self.plugin.gui.show_error(f"File error: {str(e)}")
             logging.error(f"File processing failed: {file_path} - {str(e)}")
+            self.plugin.on_file_failed(file_path)
 
     def _validate_file(self, file_path):
         """Check if file should be processed"""
@@ -3,6 +3,7 @@
 # # This file implements the GUI for the LMStudio AI Coder plugin using Tkinter.
 #
 
+import queue
 import logging
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
@@ -11,19 +12,29 @@ from pathlib import Path
 from tkinter import simpledialog
 
 class LMSGUI:
+    # Aktualisierungsintervall der Oberfläche in Millisekunden (10 Bilder/s)
+    FRAME_MS = 100
+    MAX_ERROR_LINES = 500
+
     def __init__(self, plugin):
         self.plugin = plugin
+        # Worker-Threads melden Ereignisse nur über diese Queue, Tk liest sie per after()
+        self.events = plugin.message_queue
         self.root = tk.Tk()
         self._setup_main_window()
         self._create_widgets()
         self._setup_bindings()
+        self.root.after(self.FRAME_MS, self._drain_events)
         logging.info("GUI initialized")
 
     def _setup_main_window(self):
         self.root.title("LMStudio AI Coder")
         #self.root.geometry("615x500")
         self.root.geometry("")  # Keine feste Größe setzen
-        self.root.iconbitmap("icon.ico")  # Icon setzen (Datei muss existieren)
+        try:
+            self.root.iconbitmap("icon.ico")  # Icon setzen (Datei muss existieren)
+        except tk.TclError:
+            logging.warning("Window icon not supported on this platform")
         self.style = ttk.Style()
         self.style.configure('TNotebook.Tab', padding=[20, 5])
 
@@ -41,6 +52,9 @@ class LMSGUI:
         
         # Evolution Tab
         self._build_evolution_tab()
+        
+        # Metrics Tab
+        self._build_metrics_tab()
 
         self.notebook.pack(expand=True, fill='both')
 
@@ -57,6 +71,9 @@ class LMSGUI:
         # Prompt Editors
         self._setup_prompt_editors(frame)
         
+        # Processing Options
+        self._setup_options(frame)
+        
         # Control Buttons
         self._setup_control_buttons(frame)
         
@@ -68,6 +85,16 @@ class LMSGUI:
         self.status_var = tk.StringVar(value="Ready")
         ttk.Label(frame, textvariable=self.status_var).grid(row=6, columnspan=4)
         
+        # Errors (nicht blockierend, statt Dialog pro Fehler)
+        error_frame = ttk.Frame(frame)
+        self.error_count_var = tk.StringVar(value="Errors: 0")
+        ttk.Label(error_frame, textvariable=self.error_count_var).pack(side='left')
+        ttk.Button(error_frame, text="Clear", command=self._clear_errors).pack(side='right')
+        error_frame.grid(row=7, columnspan=4, sticky='ew')
+        self.error_text = scrolledtext.ScrolledText(frame, wrap=tk.WORD, width=70, height=5, state='disabled')
+        self.error_text.grid(row=8, columnspan=4, pady=(0, 10))
+        self.error_count = 0
+        
         self.notebook.add(frame, text="File Processing")
 
     def _setup_prompt_editors(self, parent):
@@ -87,6 +114,65 @@ class LMSGUI:
         
         notebook.grid(row=2, columnspan=4, pady=10)
 
+    def _setup_options(self, parent):
+        options_frame = ttk.Frame(parent)
+        
+        self.stream_var = tk.BooleanVar(value=self.plugin.api_handler.stream)
+        ttk.Checkbutton(
+            options_frame,
+            text="Streaming (live progress)",
+            variable=self.stream_var,
+            command=self._toggle_streaming
+        ).pack(side='left', padx=5)
+        
+        self.cache_var = tk.BooleanVar(value=self.plugin.api_handler.cache.enabled)
+        ttk.Checkbutton(
+            options_frame,
+            text="Use response cache",
+            variable=self.cache_var,
+            command=self._toggle_cache
+        ).pack(side='left', padx=5)
+        
+        self.incremental_var = tk.BooleanVar(value=self.plugin.incremental)
+        ttk.Checkbutton(
+            options_frame,
+            text="Incremental (changed files only)",
+            variable=self.incremental_var,
+            command=self._toggle_incremental
+        ).pack(side='left', padx=5)
+        
+        self.resume_var = tk.BooleanVar(value=self.plugin.resume)
+        ttk.Checkbutton(
+            options_frame,
+            text="Resume interrupted run",
+            variable=self.resume_var,
+            command=self._toggle_resume
+        ).pack(side='left', padx=5)
+        
+        ttk.Label(options_frame, text="Output:").pack(side='left', padx=(15, 2))
+        self.output_mode = ttk.Combobox(
+            options_frame,
+            state='readonly',
+            width=8,
+            values=self.plugin.writer.MODES
+        )
+        self.output_mode.set(self.plugin.writer.mode)
+        self.output_mode.bind("<<ComboboxSelected>>", self._select_output_mode)
+        self.output_mode.pack(side='left')
+        
+        ttk.Label(options_frame, text="Order:").pack(side='left', padx=(15, 2))
+        self.schedule_order = ttk.Combobox(
+            options_frame,
+            state='readonly',
+            width=6,
+            values=self.plugin.file_handler.file_queue.ORDERS
+        )
+        self.schedule_order.set(self.plugin.file_handler.file_queue.order)
+        self.schedule_order.bind("<<ComboboxSelected>>", self._select_schedule_order)
+        self.schedule_order.pack(side='left')
+        
+        options_frame.grid(row=3, columnspan=4, sticky='w')
+
     def _setup_control_buttons(self, parent):
         btn_frame = ttk.Frame(parent)
         
@@ -155,6 +241,15 @@ class LMSGUI:
         
         self.notebook.add(frame, text="Evolution")
 
+    def _build_metrics_tab(self):
+        frame = ttk.Frame(self.notebook)
+        
+        ttk.Label(frame, text="Last run (exported to metrics/):").pack(anchor='w')
+        self.metrics_text = scrolledtext.ScrolledText(frame, height=12, font=('Courier', 9), state='disabled')
+        self.metrics_text.pack(expand=True, fill='both')
+        
+        self.notebook.add(frame, text="Metrics")
+
     def _setup_bindings(self):
         self.root.protocol("WM_DELETE_WINDOW", self._safe_exit)
         self.root.bind("<Control-s>", lambda e: self._save_prompt())
@@ -250,18 +345,37 @@ class LMSGUI:
         self.start_btn.config(state='disabled')
         self.stop_btn.config(state='normal')
         
+        # Verzeichnisse werden erst im Worker-Thread durchsucht (Generator)
         if Path(path).is_file():
-            files = [path]
+            files, validated = [path], False
         else:
-            files = [f for f in Path(path).rglob('*') if f.is_file()]
+            files, validated = self.plugin.file_handler.walk(path, with_size=True), True
         
-        Thread(target=self.plugin.start_processing, args=(files,), daemon=True).start()
+        Thread(target=self.plugin.start_processing, args=(files, path, validated), daemon=True).start()
 
     def _stop_processing(self):
         self.plugin.stop_processing()
         self.start_btn.config(state='normal')
         self.stop_btn.config(state='disabled')
 
+    def _toggle_streaming(self):
+        self.plugin.api_handler.stream = self.stream_var.get()
+
+    def _toggle_cache(self):
+        self.plugin.api_handler.cache.enabled = self.cache_var.get()
+
+    def _toggle_incremental(self):
+        self.plugin.incremental = self.incremental_var.get()
+
+    def _toggle_resume(self):
+        self.plugin.resume = self.resume_var.get()
+
+    def _select_output_mode(self, event=None):
+        self.plugin.writer.mode = self.output_mode.get()
+
+    def _select_schedule_order(self, event=None):
+        self.plugin.file_handler.file_queue.order = self.schedule_order.get()
+
     def _run_optimization(self):
         if not self.plugin.current_prompt:
             self.show_error("No active prompt to optimize")
@@ -273,20 +387,87 @@ class LMSGUI:
             self.plugin.stop()
             self.root.destroy()
 
+    def _drain_events(self):
+        """Apply queued events once per frame, keeping only the latest status/progress"""
+        status = progress = summary = None
+        errors = []
+        completed = False
+        while True:
+            try:
+                kind, value = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'status':
+                status = value
+            elif kind == 'progress':
+                progress = value
+            elif kind == 'error':
+                errors.append(value)
+                status = f"ERROR: {value}"
+            elif kind == 'summary':
+                summary = value
+            elif kind == 'complete':
+                completed = True
+
+        if progress is not None:
+            self.progress['value'] = progress
+        if status is not None:
+            self.status_var.set(status)
+        if errors:
+            self._append_errors(errors)
+        if summary is not None:
+            self.metrics_text.config(state='normal')
+            self.metrics_text.delete('1.0', tk.END)
+            self.metrics_text.insert(tk.END, summary)
+            self.metrics_text.config(state='disabled')
+        if completed:
+            self._on_completed()
+        self.root.after(self.FRAME_MS, self._drain_events)
+
+    def _append_errors(self, errors):
+        self.error_count += len(errors)
+        self.error_count_var.set(f"Errors: {self.error_count}")
+        self.error_text.config(state='normal')
+        self.error_text.insert(tk.END, "".join(f"{message}\n" for message in errors))
+        lines = int(self.error_text.index('end-1c').split('.')[0])
+        if lines > self.MAX_ERROR_LINES:
+            self.error_text.delete('1.0', f"{lines - self.MAX_ERROR_LINES}.0")
+        self.error_text.see(tk.END)
+        self.error_text.config(state='disabled')
+
+    def _clear_errors(self):
+        self.error_count = 0
+        self.error_count_var.set("Errors: 0")
+        self.error_text.config(state='normal')
+        self.error_text.delete('1.0', tk.END)
+        self.error_text.config(state='disabled')
+
+    def _on_completed(self):
+        self.start_btn.config(state='normal')
+        self.stop_btn.config(state='disabled')
+        if self.plugin.cancel_event.is_set():
+            messagebox.showinfo("Cancelled", "Processing cancelled, use 'Resume' to continue later")
+        elif self.error_count:
+            messagebox.showwarning("Complete", f"Processing completed with {self.error_count} errors")
+        else:
+            messagebox.showinfo("Complete", "Processing completed successfully")
+
+    # Die folgenden Methoden sind threadsicher und dürfen aus Worker-Threads aufgerufen werden
+
     def update_status(self, message):
-        self.status_var.set(message)
+        self.events.put(('status', message))
         logging.info(message)
 
     def show_error(self, message):
-        self.status_var.set(f"ERROR: {message}")
+        self.events.put(('error', message))
         logging.error(message)
-        messagebox.showerror("Error", message)
+
+    def show_summary(self, table, summary):
+        self.events.put(('summary', table))
+        logging.info(f"Run metrics:\n{table}")
 
     def show_completion_message(self):
-        messagebox.showinfo("Complete", "Processing completed successfully")
-        self.start_btn.config(state='normal')
-        self.stop_btn.config(state='disabled')
+        self.events.put(('complete', None))
 
     def update_progress(self, value):
-        self.progress['value'] = value
-        self.root.update_idletasks()
\ No newline at end of file
+        self.events.put(('progress', value))
\ No newline at end of file
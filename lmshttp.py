@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+## Dateiname: lmshttp.py (Abbrechbare HTTP-Verbindungen)
+# requests kann eine blockierte Anfrage nicht von außen beenden. Die Verbindung jeder
+# laufenden Anfrage wird pro Thread vermerkt, ein Abbruch schließt dann ihren Socket.
+#
+import socket
+import threading
+from requests.adapters import HTTPAdapter
+from urllib3 import connection, connectionpool
+
+# Thread-ID -> Verbindung, die dieser Thread gerade aus dem Pool entliehen hat
+_connections = {}
+_lock = threading.Lock()
+
+class _TrackingConnection:
+    def connect(self):
+        super().connect()
+        # http.client setzt sock bei Antworten ohne Keep-Alive auf None, gelesen
+        # wird aber weiter über diesen Socket
+        self.request_socket = self.sock
+
+
+class _HTTPConnection(_TrackingConnection, connection.HTTPConnection):
+    pass
+
+
+class _HTTPSConnection(_TrackingConnection, connection.HTTPSConnection):
+    pass
+
+
+class _TrackingPool:
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout)
+        with _lock:
+            _connections[threading.get_ident()] = conn
+        return conn
+
+    def _put_conn(self, conn):
+        with _lock:
+            # None: die Verbindung wurde nach einem Fehler geschlossen
+            if conn is None or _connections.get(threading.get_ident()) is conn:
+                _connections.pop(threading.get_ident(), None)
+        super()._put_conn(conn)
+
+
+# Gleiche Klassennamen wie in urllib3, sie erscheinen in Fehlermeldungen
+class HTTPConnectionPool(_TrackingPool, connectionpool.HTTPConnectionPool):
+    ConnectionCls = _HTTPConnection
+
+
+class HTTPSConnectionPool(_TrackingPool, connectionpool.HTTPSConnectionPool):
+    ConnectionCls = _HTTPSConnection
+
+
+class LMSAbortableAdapter(HTTPAdapter):
+    """Keep-alive adapter whose requests can be aborted from another thread"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': HTTPConnectionPool, 'https': HTTPSConnectionPool}
+
+
+def abort_requests(thread_ids):
+    """Shut down the sockets used by these threads, returns the number of aborted requests"""
+    with _lock:
+        connections = [_connections.get(thread_id) for thread_id in thread_ids]
+    aborted = 0
+    for conn in connections:
+        sock = getattr(conn, 'request_socket', None)
+        if sock is None:
+            # Noch im Verbindungsaufbau, das Verbindungs-Timeout begrenzt die Wartezeit
+            continue
+        try:
+            # shutdown weckt einen blockierten recv() sofort, close allein nicht
+            sock.shutdown(socket.SHUT_RDWR)
+            aborted += 1
+        except OSError:
+            pass
+    return aborted
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+## Dateiname: lmsjobs.py (Auftragsverfolgung)
+# Verfolgt den Zustand jeder Datei eines Laufs und meldet das Ende sofort
+#
+import logging
+import threading
+
+class LMSJobTracker:
+    QUEUED = 'queued'
+    READING = 'reading'
+    IN_FLIGHT = 'in-flight'
+    CACHED = 'cached'
+    WRITTEN = 'written'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    STATES = (QUEUED, READING, IN_FLIGHT, CACHED, WRITTEN, FAILED, CANCELLED)
+    FINAL_STATES = {WRITTEN, FAILED, CANCELLED}
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.on_complete = None
+        self._reset()
+
+    def _reset(self):
+        self.states = {}
+        self.counts = dict.fromkeys(self.STATES, 0)
+        self.cache_hits = 0
+        self.total = 0
+        self.finished = 0
+        self.closed = False
+        self.active = False
+
+    def start(self):
+        """Begin a new run"""
+        with self._cond:
+            self._reset()
+            self.active = True
+
+    def add(self, file_path):
+        """Register a file as queued"""
+        with self._cond:
+            self.states[str(file_path)] = self.QUEUED
+            self.counts[self.QUEUED] += 1
+            self.total += 1
+
+    def discard(self, file_path):
+        """Forget a file that was not accepted for processing"""
+        with self._cond:
+            state = self.states.pop(str(file_path), None)
+            if state is None:
+                return
+            self.counts[state] -= 1
+            self.total -= 1
+            if state in self.FINAL_STATES:
+                self.finished -= 1
+
+    def set_state(self, file_path, state):
+        """Move a file to a new state, final states are not left again"""
+        with self._cond:
+            key = str(file_path)
+            old = self.states.get(key)
+            if old is None or old in self.FINAL_STATES or old == state:
+                return
+            self.states[key] = state
+            self.counts[old] -= 1
+            self.counts[state] += 1
+            if state == self.CACHED:
+                self.cache_hits += 1
+            if state in self.FINAL_STATES:
+                self.finished += 1
+                completed = self._check_complete()
+            else:
+                completed = False
+        if completed:
+            self._notify_complete()
+
+    def cancel(self):
+        """Mark all unfinished files as cancelled and end the run"""
+        with self._cond:
+            for key, state in self.states.items():
+                if state not in self.FINAL_STATES:
+                    self.states[key] = self.CANCELLED
+                    self.counts[state] -= 1
+                    self.counts[self.CANCELLED] += 1
+                    self.finished += 1
+            self.closed = True
+            completed = self._check_complete()
+        if completed:
+            self._notify_complete()
+
+    def close(self):
+        """No more files will be added to this run"""
+        with self._cond:
+            self.closed = True
+            completed = self._check_complete()
+        if completed:
+            self._notify_complete()
+
+    def _check_complete(self):
+        # Aufruf nur mit gehaltener Sperre
+        if self.active and self.closed and self.finished >= self.total:
+            self.active = False
+            self._cond.notify_all()
+            return True
+        return False
+
+    def _notify_complete(self):
+        if self.on_complete:
+            try:
+                self.on_complete()
+            except Exception as e:
+                logging.error(f"Completion handler failed: {str(e)}")
+
+    def wait(self, timeout=None):
+        """Block until the current run has finished, returns False on timeout"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self.active, timeout)
+
+    def progress(self):
+        """Finished files in percent"""
+        with self._cond:
+            if not self.total:
+                return 0.0
+            return self.finished / self.total * 100
+
+    def file_states(self):
+        """Copy of the state of every file of the current run"""
+        with self._cond:
+            return dict(self.states)
+
+    def summary(self):
+        """Counts per state for the current run"""
+        with self._cond:
+            summary = dict(self.counts)
+            summary['total'] = self.total
+            summary['cache_hits'] = self.cache_hits
+            return summary
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+## Dateiname: lmsjournal.py (Lauf-Journal)
+# Append-only Protokoll pro Lauf, damit unterbrochene Läufe fortgesetzt werden können
+#
+import os
+import json
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from datetime import datetime
+
+class LMSJournal:
+    def __init__(self, target, journal_dir="journal"):
+        self.target = str(Path(target).resolve())
+        key = hashlib.sha256(self.target.encode('utf-8')).hexdigest()[:16]
+        self.run_dir = Path(journal_dir) / key
+        self.run_dir.mkdir(parents=True, exist_ok=True)
+        self.path = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    def _latest(self):
+        runs = sorted(self.run_dir.glob("run_*.jsonl"))
+        return runs[-1] if runs else None
+
+    def _read(self, path):
+        records = []
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # Letzte Zeile nach einem Absturz evtl. unvollständig
+                        continue
+        except OSError as e:
+            logging.error(f"Failed to read journal {path}: {str(e)}")
+        return records
+
+    def resumable(self, prompt_hash):
+        """Return files already written by the last unfinished run with this prompt"""
+        latest = self._latest()
+        if latest is None:
+            return None
+        records = self._read(latest)
+        if not records or records[0].get('prompt') != prompt_hash:
+            return None
+        # Nur direkt geschriebene Dateien sind nach einem Abbruch wirklich fertig
+        if records[0].get('mode') != 'write':
+            return None
+        if any(r.get('event') == 'complete' for r in records):
+            return None
+
+        states = {}
+        for record in records:
+            if 'file' in record:
+                states[record['file']] = record.get('state')
+        self.path = latest
+        return {f for f, state in states.items() if state == 'written'}
+
+    def begin(self, prompt_hash, resume=False, mode='write'):
+        """Open the journal of a new run, or append to the resumed one"""
+        with self._lock:
+            if not (resume and self.path):
+                self.path = self.run_dir / f"run_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.jsonl"
+                event = {'event': 'run', 'target': self.target, 'prompt': prompt_hash, 'mode': mode}
+            else:
+                event = {'event': 'resume'}
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._append(event)
+
+    def _append(self, record):
+        record['time'] = datetime.now().isoformat()
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            if self._file is None:
+                return
+            try:
+                self._file.write(line + "\n")
+                self._file.flush()
+            except (OSError, ValueError) as e:
+                logging.error(f"Failed to write journal: {str(e)}")
+
+    def record(self, file_path, state, result_hash=None):
+        """Append a file state change"""
+        record = {'file': os.path.abspath(file_path), 'state': state}
+        if result_hash:
+            record['hash'] = result_hash
+        self._append(record)
+
+    def finish(self, summary, cancelled=False):
+        """Mark the run as complete (or cancelled) and close the journal"""
+        self._append({'event': 'cancelled' if cancelled else 'complete', 'summary': summary})
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
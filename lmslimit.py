@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+## Dateiname: lmslimit.py (Adaptive Parallelität)
+# AIMD-Regelung der gleichzeitigen Anfragen an den LM Studio Server
+#
+import time
+import logging
+import threading
+
+class LMSConcurrencyLimiter:
+    """Additive increase / multiplicative decrease of the in-flight request limit"""
+
+    # Halbieren bei Überlast (429/503, Timeout), leicht senken bei steigender Latenz
+    BACKOFF = 0.5
+    LATENCY_BACKOFF = 0.9
+    # Latenz pro Token, ab der der Server als ausgelastet gilt (Vielfaches des Bestwerts)
+    LATENCY_TOLERANCE = 2.0
+
+    def __init__(self, max_limit, min_limit=1, name="LM Studio"):
+        self.name = name
+        self.max_limit = max(1, int(max_limit))
+        self.min_limit = max(1, min(int(min_limit), self.max_limit))
+        # Mit halber Obergrenze beginnen und von dort hochtasten
+        self.limit = float(max(self.min_limit, self.max_limit // 2))
+        self.in_flight = 0
+        self._baseline = None
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Block until another request may be sent"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    def try_acquire(self):
+        """Take a slot without blocking, returns False if the limit is reached"""
+        with self._cond:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, latency, units=1, overloaded=False):
+        """Report the outcome of a request and adapt the limit"""
+        with self._cond:
+            self.in_flight -= 1
+            old = int(self.limit)
+            if overloaded:
+                self._decrease(self.BACKOFF, latency)
+            else:
+                sample = latency / max(1, units)
+                if self._baseline is None or sample < self._baseline:
+                    self._baseline = sample
+                else:
+                    # Bestwert driftet langsam mit, z.B. nach einem Modellwechsel
+                    self._baseline = self._baseline * 0.95 + sample * 0.05
+                if sample > self._baseline * self.LATENCY_TOLERANCE:
+                    self._decrease(self.LATENCY_BACKOFF, latency)
+                else:
+                    # Etwa +1 pro vollem Fenster erfolgreicher Anfragen
+                    self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            if int(self.limit) != old:
+                logging.info(f"Concurrency limit of {self.name}: {old} -> {int(self.limit)}")
+            self._cond.notify_all()
+
+    def abandon(self):
+        """Give back a slot without taking a measurement"""
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def _decrease(self, factor, latency):
+        # Aufruf nur mit gehaltener Sperre
+        now = time.monotonic()
+        # Anfragen, die gemeinsam in die Überlast liefen, nur einmal bestrafen
+        if now - self._last_decrease < latency:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * factor)
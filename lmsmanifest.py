@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+## Dateiname: lmsmanifest.py (Inkrementelle Verarbeitung)
+# Merkt sich pro Zielverzeichnis, welche Dateien mit welchem Prompt verarbeitet wurden
+#
+import os
+import json
+import hashlib
+import logging
+import threading
+from pathlib import Path
+
+class LMSManifest:
+    def __init__(self, target, manifest_dir="manifests"):
+        self.target = Path(target).resolve()
+        self.manifest_dir = Path(manifest_dir)
+        self.manifest_dir.mkdir(exist_ok=True)
+        name = hashlib.sha256(str(self.target).encode('utf-8')).hexdigest()[:16]
+        self.path = self.manifest_dir / f"{name}.json"
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def prompt_hash(prompt):
+        """Hash the parts of a prompt that influence the result"""
+        payload = json.dumps({
+            'positive': str(prompt.get('positive', '')),
+            'negative': str(prompt.get('negative', ''))
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def file_hash(file_path):
+        """Hash file content in blocks"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.entries = data.get('files', {})
+        except (OSError, ValueError) as e:
+            logging.error(f"Failed to load manifest {self.path}: {str(e)}")
+            self.entries = {}
+
+    def needs_processing(self, file_path, prompt_hash):
+        """Check if file is new, modified or was processed with another prompt"""
+        key = str(Path(file_path).resolve())
+        with self._lock:
+            entry = self.entries.get(key)
+        if entry is None or entry.get('prompt') != prompt_hash:
+            return True
+
+        try:
+            stat = os.stat(key)
+            if stat.st_size != entry['size']:
+                return True
+            if stat.st_mtime_ns == entry['mtime']:
+                return False
+            # Zeitstempel geändert (z.B. Checkout), Inhalt evtl. gleich
+            return self.file_hash(key) != entry['hash']
+        except (OSError, KeyError):
+            return True
+
+    def record(self, file_path, prompt_hash):
+        """Remember file state after a successful pass"""
+        key = str(Path(file_path).resolve())
+        try:
+            stat = os.stat(key)
+            entry = {
+                'mtime': stat.st_mtime_ns,
+                'size': stat.st_size,
+                'hash': self.file_hash(key),
+                'prompt': prompt_hash
+            }
+        except OSError as e:
+            logging.error(f"Failed to record manifest entry {key}: {str(e)}")
+            return
+        with self._lock:
+            self.entries[key] = entry
+
+    def save(self):
+        """Write manifest atomically"""
+        with self._lock:
+            data = {'target': str(self.target), 'files': dict(self.entries)}
+        temp = self.path.with_suffix('.tmp')
+        with self._save_lock:
+            try:
+                with open(temp, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(temp, self.path)
+            except OSError as e:
+                logging.error(f"Failed to save manifest {self.path}: {str(e)}")
+
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+## Dateiname: lmsmetrics.py (Messwerte)
+# Zeiten, Tokens und Bytes pro Datei, Export als JSON Lines und Prometheus-Textdatei
+#
+import os
+import json
+import math
+import time
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from datetime import datetime
+
+class LMSMetrics:
+    # Zeitmessungen in Sekunden, Reihenfolge entspricht der Pipeline
+    TIMINGS = ('read', 'queue_wait', 'ttft', 'generation')
+    COUNTERS = ('prompt_tokens', 'completion_tokens', 'bytes_written')
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, metrics_dir="metrics"):
+        self.metrics_dir = Path(metrics_dir)
+        self.enabled = True
+        self._lock = threading.Lock()
+        self.start_run()
+
+    def start_run(self):
+        """Forget the measurements of the previous run"""
+        with self._lock:
+            self.files = {}
+            self._queued = {}
+            self.started = time.monotonic()
+            self.run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    def _record(self, file_path):
+        # Aufruf nur mit gehaltener Sperre
+        return self.files.setdefault(str(file_path), {})
+
+    def set(self, file_path, **values):
+        """Set per-file values, e.g. read=0.002 or cached=True"""
+        with self._lock:
+            self._record(file_path).update(values)
+
+    def add(self, file_path, **values):
+        """Add to per-file values (chunks and retries accumulate)"""
+        with self._lock:
+            record = self._record(file_path)
+            for key, value in values.items():
+                record[key] = record.get(key, 0) + value
+
+    def queued(self, file_path):
+        """The file's content was handed to the API stage"""
+        with self._lock:
+            self._queued.setdefault(str(file_path), time.monotonic())
+
+    def dispatched(self, file_path):
+        """The first request for the file leaves the queue (or is answered from the cache)"""
+        with self._lock:
+            queued = self._queued.pop(str(file_path), None)
+            if queued is not None:
+                self._record(file_path)['queue_wait'] = time.monotonic() - queued
+
+    def first_token(self, file_path, elapsed):
+        with self._lock:
+            self._record(file_path).setdefault('ttft', elapsed)
+
+    @staticmethod
+    def quantile(values, q):
+        """Nearest-rank quantile of values, None if empty"""
+        if not values:
+            return None
+        ordered = sorted(values)
+        return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+    def summary(self, states=None):
+        """Aggregate the per-file values of the current run"""
+        with self._lock:
+            files = {path: dict(record) for path, record in self.files.items()}
+            duration = time.monotonic() - self.started
+
+        timings = {}
+        for name in self.TIMINGS:
+            values = [record[name] for record in files.values() if name in record]
+            timings[name] = {
+                'count': len(values),
+                'sum': sum(values),
+                'max': max(values) if values else None,
+                **{f"p{int(q * 100)}": self.quantile(values, q) for q in self.QUANTILES}
+            }
+        totals = {name: sum(record.get(name, 0) for record in files.values()) for name in self.COUNTERS}
+        by_state = {}
+        for state in (states or {}).values():
+            by_state[state] = by_state.get(state, 0) + 1
+
+        return {
+            'run': self.run_id,
+            'duration': duration,
+            'files': len(files),
+            'states': by_state,
+            'cache_hits': sum(1 for record in files.values() if record.get('cached')),
+            'timings': timings,
+            'totals': totals,
+            'files_per_second': len(files) / duration if duration > 0 else 0.0,
+            'tokens_per_second': totals['completion_tokens'] / duration if duration > 0 else 0.0
+        }
+
+    def table(self, summary):
+        """Plain text summary table for the end of a run"""
+        def ms(value):
+            return "-" if value is None else f"{value * 1000:.0f}"
+
+        lines = [f"{'Stage (ms)':<12}{'count':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'total':>10}"]
+        for name, t in summary['timings'].items():
+            lines.append(
+                f"{name:<12}{t['count']:>7}{ms(t['p50']):>9}{ms(t['p95']):>9}"
+                f"{ms(t['p99']):>9}{ms(t['max']):>9}{ms(t['sum']):>10}"
+            )
+        totals = summary['totals']
+        lines.append(
+            f"{summary['files']} files in {summary['duration']:.1f}s "
+            f"({summary['files_per_second']:.2f} files/s), {summary['cache_hits']} from cache"
+        )
+        lines.append(
+            f"Tokens: {totals['prompt_tokens']} prompt, {totals['completion_tokens']} completion "
+            f"({summary['tokens_per_second']:.1f} tok/s), {totals['bytes_written']} bytes written"
+        )
+        return "\n".join(lines)
+
+    def export(self, states=None):
+        """Write the JSON lines and Prometheus files of this run, returns the summary"""
+        summary = self.summary(states)
+        if not self.enabled:
+            return summary
+        with self._lock:
+            files = {path: dict(record) for path, record in self.files.items()}
+        try:
+            self.metrics_dir.mkdir(exist_ok=True)
+            with open(self.metrics_dir / f"run_{self.run_id}.jsonl", 'w', encoding='utf-8') as f:
+                for path, record in files.items():
+                    state = (states or {}).get(path)
+                    f.write(json.dumps({'event': 'file', 'file': path, 'state': state, **record}) + "\n")
+                f.write(json.dumps({'event': 'summary', **summary}) + "\n")
+            self._write_prometheus(summary)
+        except OSError as e:
+            logging.error(f"Failed to export metrics: {str(e)}")
+        return summary
+
+    def _write_prometheus(self, summary):
+        """Text exposition format, suitable for the node_exporter textfile collector"""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{labels} {value}")
+
+        metric("lmstudio_run_duration_seconds", "gauge", "Wall-clock time of the last run",
+               [("", round(summary['duration'], 3))])
+        metric("lmstudio_files", "gauge", "Files of the last run by final state",
+               [(f'{{state="{state}"}}', count) for state, count in summary['states'].items()])
+        metric("lmstudio_cache_hits", "gauge", "Files of the last run answered from the cache",
+               [("", summary['cache_hits'])])
+        for name, t in summary['timings'].items():
+            samples = [
+                (f'{{quantile="{q}"}}', round(t[f"p{int(q * 100)}"], 6))
+                for q in self.QUANTILES if t[f"p{int(q * 100)}"] is not None
+            ]
+            metric(f"lmstudio_{name}_seconds", "summary", f"Per-file {name.replace('_', ' ')} time",
+                   samples)
+            lines.append(f"lmstudio_{name}_seconds_sum {round(t['sum'], 6)}")
+            lines.append(f"lmstudio_{name}_seconds_count {t['count']}")
+        for name, value in summary['totals'].items():
+            metric(f"lmstudio_{name}", "gauge", f"Sum of {name.replace('_', ' ')} in the last run",
+                   [("", value)])
+
+        # Atomar ersetzen, damit kein Sammler eine halbe Datei liest
+        fd, temp = tempfile.mkstemp(prefix=".lmstudio.", suffix=".prom", dir=self.metrics_dir)
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='\n') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp, self.metrics_dir / "lmstudio.prom")
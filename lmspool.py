@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+## Dateiname: lmspool.py (Server-Pool)
+# Verteilt Anfragen auf mehrere LM Studio / OpenAI-kompatible Server
+#
+# Adresse mit optionaler Obergrenze: http://gpu-box:1234/v1/#8
+#
+import time
+import logging
+import threading
+from urllib.parse import urljoin, urldefrag
+from lmslimit import LMSConcurrencyLimiter
+from lmsretry import LMSCircuitBreaker
+
+class LMSEndpoint:
+    """One model server with its own concurrency limit and circuit breaker"""
+
+    def __init__(self, url, max_concurrency):
+        self.url = url if url.endswith('/') else url + '/'
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.limiter = LMSConcurrencyLimiter(self.max_concurrency, name=self.url)
+        self.circuit = LMSCircuitBreaker()
+        # Ergebnis der letzten Prüfung über /models
+        self.healthy = True
+        self.models = []
+
+    @property
+    def outstanding(self):
+        return self.limiter.in_flight
+
+    def has_capacity(self):
+        return self.limiter.in_flight < int(self.limiter.limit)
+
+    def __str__(self):
+        return self.url
+
+
+class LMSEndpointPool:
+    """Least-outstanding-requests routing with periodic health checks"""
+
+    HEALTH_INTERVAL = 30
+    HEALTH_TIMEOUT = 5
+    # Sekunden, die alle Server ausgefallen sein dürfen, bevor wartende Anfragen sofort scheitern
+    MAX_OUTAGE = 60.0
+
+    def __init__(self, session, endpoints):
+        self.session = session
+        self.endpoints = list(endpoints)
+        self.max_outage = self.MAX_OUTAGE
+        self._cond = threading.Condition()
+        self._health_stop = threading.Event()
+        self._health_thread = None
+
+    @staticmethod
+    def parse(spec, default_limit):
+        """Create an endpoint from 'URL' or 'URL#N' (N = maximum concurrent requests)"""
+        url, fragment = urldefrag(spec.strip())
+        limit = int(fragment) if fragment.isdigit() else default_limit
+        return LMSEndpoint(url, limit)
+
+    @property
+    def capacity(self):
+        """Sum of the per-endpoint limits"""
+        return sum(endpoint.max_concurrency for endpoint in self.endpoints)
+
+    def _candidates(self):
+        # Ungesunde Server nur meiden, solange es gesunde gibt
+        healthy = [endpoint for endpoint in self.endpoints if endpoint.healthy]
+        return healthy or self.endpoints
+
+    def available(self):
+        """True while at least one endpoint accepts requests"""
+        return any(endpoint.circuit.state == LMSCircuitBreaker.CLOSED for endpoint in self.endpoints)
+
+    def outage(self):
+        """Seconds for which every endpoint has been down, 0 while one accepts requests"""
+        return min(endpoint.circuit.down_for() for endpoint in self.endpoints)
+
+    def expired(self):
+        """True once the outage lasts longer than max_outage"""
+        return bool(self.max_outage) and self.outage() > self.max_outage
+
+    def restart_outage(self):
+        for endpoint in self.endpoints:
+            endpoint.circuit.restart_outage()
+
+    def best(self):
+        """Endpoint for requests outside the worker pool (e.g. prompt optimization)"""
+        with self._cond:
+            candidates = [e for e in self._candidates() if e.circuit.state == LMSCircuitBreaker.CLOSED]
+            return min(candidates or self._candidates(), key=lambda e: e.outstanding)
+
+    def acquire(self, cancelled):
+        """Reserve a slot on the least busy endpoint, returns None if cancelled or expired()"""
+        with self._cond:
+            while True:
+                if cancelled() or self.expired():
+                    return None
+                ready = sorted(
+                    (e for e in self._candidates() if e.has_capacity()),
+                    key=lambda e: (e.outstanding, e.outstanding / e.max_concurrency)
+                )
+                for endpoint in ready:
+                    # Kapazität zuerst prüfen, damit keine Probeanfrage ungenutzt verfällt
+                    if endpoint.circuit.allow() and endpoint.limiter.try_acquire():
+                        return endpoint
+                # Offene Schutzschalter werden nach Ablauf der Wartezeit ohne Signal frei
+                self._cond.wait(0.5)
+
+    def release(self, endpoint, latency, units=1, overloaded=False):
+        endpoint.limiter.release(latency, units, overloaded)
+        with self._cond:
+            self._cond.notify_all()
+
+    def abandon(self, endpoint):
+        endpoint.limiter.abandon()
+        with self._cond:
+            self._cond.notify_all()
+
+    def check_health(self):
+        """Query /models of every endpoint and mark unreachable ones"""
+        for endpoint in list(self.endpoints):
+            try:
+                response = self.session.get(
+                    urljoin(endpoint.url, "models"), timeout=self.HEALTH_TIMEOUT
+                )
+                response.raise_for_status()
+                endpoint.models = [m.get('id') for m in response.json().get('data', [])]
+                healthy = True
+            except Exception as e:
+                logging.debug(f"Health check failed for {endpoint}: {str(e)}")
+                healthy = False
+            if healthy != endpoint.healthy:
+                logging.info(f"Endpoint {endpoint} is {'healthy' if healthy else 'unhealthy'}")
+            endpoint.healthy = healthy
+        with self._cond:
+            self._cond.notify_all()
+
+    def start_health_checks(self):
+        """Check all endpoints now and then every HEALTH_INTERVAL seconds"""
+        if self._health_thread and self._health_thread.is_alive():
+            return
+        self._health_stop.clear()
+        self._health_thread = threading.Thread(target=self._health_loop, daemon=True)
+        self._health_thread.start()
+
+    def _health_loop(self):
+        while not self._health_stop.is_set():
+            started = time.monotonic()
+            self.check_health()
+            self._health_stop.wait(max(0, self.HEALTH_INTERVAL - (time.monotonic() - started)))
+
+    def stop(self):
+        self._health_stop.set()
+        if self._health_thread:
+            self._health_thread.join(self.HEALTH_TIMEOUT * 2)
@@ -2,17 +2,118 @@
 ## Dateiname: lmsprompt.py (Prompt Management)
 ## LMS Prompt Manager
 # 
+import os
 import json
+import time
 import logging
+import threading
 from pathlib import Path
 from datetime import datetime
+from lmsmanifest import LMSManifest
 
 class LMSPromptManager:
+    # Änderungen innerhalb dieser Zeitspanne nach einem Scan können in dieselbe
+    # mtime-Auflösung fallen, das Verzeichnis wird dann beim nächsten Zugriff erneut geprüft
+    RACY_SECONDS = 2
+
     def __init__(self):
         self.storage_dir = Path("prompts")
         self.storage_dir.mkdir(exist_ok=True)
+        # Zwischenspeicher: Name -> Metadaten und Inhalt, None für ungültige Dateien
+        self._entries = {}
+        # Name -> (mtime, Größe) der zuletzt gelesenen Datei, auch für ungültige
+        self._signatures = {}
+        self._names = []
+        self._by_hash = {}
+        self._dir_mtime = None
+        self._scanned = 0.0
+        self._lock = threading.RLock()
         logging.info("Prompt manager initialized")
 
+    def _parse(self, path):
+        """Read one prompt file, returns its registry entry or None if invalid"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if not all(key in data for key in ['name', 'positive', 'negative']):
+                raise ValueError("Invalid prompt format")
+        except Exception as e:
+            logging.warning(f"Ignoring prompt file {path}: {str(e)}")
+            return None
+        return {
+            'name': data['name'],
+            'positive': data['positive'],
+            'negative': data['negative'],
+            'language': data.get('language', 'Python'),
+            'created': str(data.get('created', '')),
+            'hash': LMSManifest.prompt_hash(data)
+        }
+
+    def _forget(self, name):
+        # Aufruf nur mit gehaltener Sperre
+        self._signatures.pop(name, None)
+        if self._entries.pop(name, None):
+            self._rebuild_index()
+
+    def _load(self, name, path, stat):
+        # Aufruf nur mit gehaltener Sperre, True wenn sich der Eintrag geändert hat
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if self._signatures.get(name) == signature:
+            return False
+        self._signatures[name] = signature
+        self._entries[name] = self._parse(path)
+        return True
+
+    def _rebuild_index(self):
+        # Aufruf nur mit gehaltener Sperre
+        self._names = sorted(name for name, entry in self._entries.items() if entry)
+        self._by_hash = {}
+        for name in self._names:
+            self._by_hash.setdefault(self._entries[name]['hash'], []).append(name)
+
+    def _refresh(self):
+        """Rescan the directory only if it changed, reparse only changed files"""
+        with self._lock:
+            try:
+                dir_mtime = os.stat(self.storage_dir).st_mtime_ns
+            except OSError:
+                return
+            # Wie beim Git-Index: eine Änderung kurz vor dem letzten Scan kann
+            # dieselbe mtime haben, dann erneut prüfen
+            if dir_mtime == self._dir_mtime and self._scanned - dir_mtime / 1e9 > self.RACY_SECONDS:
+                return
+
+            self._scanned = time.time()
+            self._dir_mtime = dir_mtime
+            seen = set()
+            changed = False
+            with os.scandir(self.storage_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith('.json') or not entry.is_file():
+                        continue
+                    name = entry.name[:-5]
+                    seen.add(name)
+                    changed = self._load(name, entry.path, entry.stat()) or changed
+            for name in set(self._signatures) - seen:
+                self._signatures.pop(name)
+                self._entries.pop(name, None)
+                changed = True
+            if changed:
+                self._rebuild_index()
+
+    def _entry(self, name):
+        """Cached entry of one prompt, reparsed if the file was edited in place"""
+        path = self.storage_dir / f"{name}.json"
+        with self._lock:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                self._forget(name)
+                return None
+            if self._load(name, path, stat):
+                self._rebuild_index()
+            return self._entries[name]
+
     def save_prompt(self, name, positive, negative, language="Python"):
         """Save prompt with strict validation"""
         prompt = {
@@ -27,6 +128,12 @@ class LMSPromptManager:
             path = self.storage_dir / f"{name}.json"
             with open(path, 'w', encoding='utf-8') as f:
                 json.dump(prompt, f, indent=2, ensure_ascii=False)
+            # Zwischenspeicher direkt aktualisieren statt neu einzulesen
+            with self._lock:
+                stat = os.stat(path)
+                self._signatures[name] = (stat.st_mtime_ns, stat.st_size)
+                self._entries[name] = dict(prompt, hash=LMSManifest.prompt_hash(prompt))
+                self._rebuild_index()
             return True
         except Exception as e:
             logging.error(f"Failed to save prompt: {str(e)}")
@@ -34,25 +141,16 @@ class LMSPromptManager:
 
     def load_prompt(self, name):
         """Load prompt with validation"""
-        try:
-            path = self.storage_dir / f"{name}.json"
-            with open(path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            # Validate structure
-            required_keys = {'name', 'positive', 'negative'}
-            if not all(key in data for key in required_keys):
-                raise ValueError("Invalid prompt format")
-            
-            return {
-                'name': data['name'],
-                'positive': data['positive'],
-                'negative': data['negative'],
-                'language': data.get('language', 'Python')
-            }
-        except Exception as e:
-            logging.error(f"Failed to load prompt '{name}': {str(e)}")
+        entry = self._entry(name)
+        if entry is None:
+            logging.error(f"Failed to load prompt '{name}': not found or invalid")
             return None
+        return {
+            'name': entry['name'],
+            'positive': entry['positive'],
+            'negative': entry['negative'],
+            'language': entry['language']
+        }
 
     def delete_prompt(self, name):
         """Delete prompt with backup"""
@@ -60,6 +158,8 @@ class LMSPromptManager:
             path = self.storage_dir / f"{name}.json"
             if path.exists():
                 path.unlink()
+                with self._lock:
+                    self._forget(name)
                 return True
             return False
         except Exception as e:
@@ -68,13 +168,30 @@ class LMSPromptManager:
 
     def list_prompts(self):
         """List only valid prompts"""
-        valid_prompts = []
-        for f in self.storage_dir.glob("*.json"):
-            try:
-                with open(f, 'r', encoding='utf-8') as file:
-                    data = json.load(file)
-                    if all(key in data for key in ['name', 'positive', 'negative']):
-                        valid_prompts.append(f.stem)
-            except:
+        self._refresh()
+        with self._lock:
+            return list(self._names)
+
+    def by_hash(self, prompt_hash):
+        """Names of the prompts with this content hash (see LMSManifest.prompt_hash)"""
+        self._refresh()
+        with self._lock:
+            return list(self._by_hash.get(prompt_hash, []))
+
+    def search(self, name=None, language=None, since=None, until=None):
+        """Prompt names matching a name part, a language and a creation date range (ISO strings)"""
+        self._refresh()
+        with self._lock:
+            entries = [(key, self._entries[key]) for key in self._names]
+        results = []
+        for key, entry in entries:
+            if name and name.lower() not in key.lower() and name.lower() not in str(entry['name']).lower():
+                continue
+            if language and str(entry['language']).lower() != language.lower():
+                continue
+            if since and entry['created'] < since:
+                continue
+            if until and entry['created'] >= until:
                 continue
-        return valid_prompts
+            results.append(key)
+        return results
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+## Dateiname: lmsreport.py (Statusausgabe ohne GUI)
+# Reporter ersetzen LMSGUI bei Batch-Läufen (gleiche Methoden wie die Oberfläche)
+#
+import sys
+import json
+import logging
+import threading
+from datetime import datetime
+
+class LMSReporter:
+    """Headless replacement for LMSGUI, collects errors and signals completion"""
+
+    def __init__(self, auto_optimize=False):
+        self.auto_optimize = auto_optimize
+        self.errors = []
+        self.completed = threading.Event()
+        self._lock = threading.Lock()
+
+    def update_status(self, message):
+        logging.info(message)
+
+    def show_error(self, message):
+        with self._lock:
+            self.errors.append(message)
+        logging.error(message)
+
+    def update_progress(self, value):
+        pass
+
+    def show_summary(self, table, summary):
+        logging.info(f"Run metrics:\n{table}")
+
+    def show_completion_message(self):
+        self.completed.set()
+
+
+class ConsoleReporter(LMSReporter):
+    """Plain text output for terminals and build logs"""
+
+    def __init__(self, auto_optimize=False, stream=None):
+        super().__init__(auto_optimize)
+        self.stream = stream or sys.stdout
+        self._last_progress = -1
+
+    def _print(self, text, stream=None):
+        with self._lock:
+            print(text, file=stream or self.stream, flush=True)
+
+    def update_status(self, message):
+        super().update_status(message)
+        self._print(message)
+
+    def show_error(self, message):
+        super().show_error(message)
+        self._print(f"ERROR: {message}", sys.stderr)
+
+    def update_progress(self, value):
+        # Nur ganze 5%-Schritte ausgeben
+        step = int(value) // 5 * 5
+        with self._lock:
+            if step == self._last_progress:
+                return
+            self._last_progress = step
+        self._print(f"Progress: {step}%")
+
+    def show_summary(self, table, summary):
+        super().show_summary(table, summary)
+        self._print(table)
+
+    def show_completion_message(self):
+        self._print(f"Processing completed ({len(self.errors)} errors)")
+        super().show_completion_message()
+
+
+class JSONLinesReporter(LMSReporter):
+    """One JSON object per event, for machine consumption"""
+
+    def __init__(self, auto_optimize=False, stream=None):
+        super().__init__(auto_optimize)
+        self.stream = stream or sys.stdout
+
+    def _emit(self, event, **fields):
+        record = {'event': event, 'time': datetime.now().isoformat(), **fields}
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+    def update_status(self, message):
+        super().update_status(message)
+        self._emit('status', message=message)
+
+    def show_error(self, message):
+        super().show_error(message)
+        self._emit('error', message=message)
+
+    def update_progress(self, value):
+        self._emit('progress', value=round(value, 2))
+
+    def show_summary(self, table, summary):
+        super().show_summary(table, summary)
+        self._emit('metrics', summary=summary)
+
+    def show_completion_message(self):
+        self._emit('complete', errors=len(self.errors))
+        super().show_completion_message()
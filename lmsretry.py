@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+## Dateiname: lmsretry.py (Wiederholungen und Schutzschalter)
+# Vorübergehende Fehler (z.B. Modell wird neu geladen) nicht sofort als Fehlschlag werten
+#
+import time
+import random
+import logging
+import threading
+import requests
+
+class LMSRetryPolicy:
+    """Exponential backoff with full jitter and a retry budget per run"""
+
+    MAX_ATTEMPTS = 3
+    BASE_DELAY = 1.0
+    MAX_DELAY = 30.0
+    # Wiederholungen pro Lauf, damit ein toter Server den Lauf nicht endlos verlängert
+    RUN_BUDGET = 50
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+    # Status, die auf einen nicht erreichbaren Server hindeuten (429 regelt LMSConcurrencyLimiter)
+    DOWN_STATUS = {500, 502, 503, 504}
+
+    def __init__(self, max_attempts=None, run_budget=None):
+        self.max_attempts = max(1, int(max_attempts or self.MAX_ATTEMPTS))
+        self.run_budget = self.RUN_BUDGET if run_budget is None else run_budget
+        self.remaining = self.run_budget
+        self._lock = threading.Lock()
+
+    def start_run(self):
+        """Refill the retry budget for a new run"""
+        with self._lock:
+            self.remaining = self.run_budget
+
+    @staticmethod
+    def _status(error):
+        response = getattr(error, 'response', None)
+        return response.status_code if response is not None else None
+
+    def retryable(self, error):
+        if isinstance(error, requests.exceptions.HTTPError):
+            return self._status(error) in self.RETRY_STATUS
+        return isinstance(error, (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+            requests.exceptions.ChunkedEncodingError
+        ))
+
+    def endpoint_down(self, error):
+        """Errors that count towards opening the circuit breaker"""
+        if isinstance(error, requests.exceptions.HTTPError):
+            return self._status(error) in self.DOWN_STATUS
+        return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+    def next_delay(self, attempt, error):
+        """Delay before the next attempt, or None if the error is final"""
+        if attempt >= self.max_attempts or not self.retryable(error):
+            return None
+        with self._lock:
+            if self.remaining <= 0:
+                logging.warning("Retry budget of this run exhausted")
+                return None
+            self.remaining -= 1
+
+        delay = random.uniform(0, min(self.MAX_DELAY, self.BASE_DELAY * 2 ** (attempt - 1)))
+        # Retry-After des Servers hat Vorrang, sofern in Sekunden angegeben
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(self.MAX_DELAY, float(retry_after)))
+        return delay
+
+
+class LMSCircuitBreaker:
+    """Pauses dispatch while the endpoint is down, one probe request tests recovery"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+    FAILURE_THRESHOLD = 5
+    COOLDOWN = 10.0
+    MAX_COOLDOWN = 120.0
+
+    def __init__(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.cooldown = self.COOLDOWN
+        self._opened_at = 0.0
+        # Beginn des aktuellen Ausfalls, fehlgeschlagene Proben setzen ihn nicht zurück
+        self._down_since = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Check without blocking whether a request may be sent now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() >= self._opened_at + self.cooldown:
+                # Dieser Aufrufer ist die Probeanfrage, alle anderen warten weiter
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def abort_probe(self):
+        """The probe was never answered (cancelled), let the next request probe"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+    def record_success(self):
+        """Returns True if this closed an open circuit"""
+        with self._lock:
+            recovered = self.state != self.CLOSED
+            self.state = self.CLOSED
+            self.failures = 0
+            self.cooldown = self.COOLDOWN
+            self._down_since = None
+            return recovered
+
+    def down_for(self):
+        """Seconds since the circuit first opened, 0 while it is closed"""
+        with self._lock:
+            if self.state == self.CLOSED or self._down_since is None:
+                return 0.0
+            return time.monotonic() - self._down_since
+
+    def restart_outage(self):
+        """Count an ongoing outage from now on (new run)"""
+        with self._lock:
+            if self._down_since is not None:
+                self._down_since = time.monotonic()
+
+    def record_failure(self):
+        """Returns True if this opened the circuit"""
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN:
+                # Probe fehlgeschlagen: länger warten
+                self.cooldown = min(self.MAX_COOLDOWN, self.cooldown * 2)
+            elif self.state == self.OPEN or self.failures < self.FAILURE_THRESHOLD:
+                return False
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            if self._down_since is None:
+                self._down_since = self._opened_at
+            return True
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+## Dateiname: lmsschedule.py (Ablaufplanung)
+# Prioritätswarteschlange für Dateien: nach geschätzten Tokens sortiert, fair über Gruppen verteilt
+#
+import heapq
+import itertools
+import threading
+from collections import deque
+
+class LMSScheduler:
+    """Queue replacement ordering tasks by cost, round-robin across groups"""
+
+    # sjf: kleine Dateien zuerst, ljf: große zuerst, fifo: Einreihungsreihenfolge
+    ORDERS = ('sjf', 'ljf', 'fifo')
+
+    def __init__(self, order='sjf'):
+        self.order = order
+        self._cond = threading.Condition()
+        self._counter = itertools.count()
+        # Steueraufgaben (z.B. shutdown) haben immer Vorrang
+        self._control = deque()
+        self._heaps = {}
+        self._rotation = deque()
+        self._size = 0
+
+    def _priority(self, cost):
+        if self.order == 'ljf':
+            return -cost
+        if self.order == 'sjf':
+            return cost
+        return 0
+
+    def put(self, task, cost=0, group=None):
+        """Queue a task, everything except 'process' is a control task"""
+        with self._cond:
+            if task.get('action') != 'process':
+                self._control.append(task)
+            else:
+                heap = self._heaps.get(group)
+                if heap is None:
+                    heap = self._heaps[group] = []
+                    self._rotation.append(group)
+                # Zähler als Gleichstand-Kriterium hält gleiche Kosten in FIFO-Reihenfolge
+                heapq.heappush(heap, (self._priority(cost), next(self._counter), task))
+            self._size += 1
+            self._cond.notify()
+
+    def _pop(self):
+        # Aufruf nur mit gehaltener Sperre
+        if self._control:
+            task = self._control.popleft()
+        else:
+            group = self._rotation.popleft()
+            heap = self._heaps[group]
+            task = heapq.heappop(heap)[2]
+            if heap:
+                self._rotation.append(group)
+            else:
+                del self._heaps[group]
+        self._size -= 1
+        return task
+
+    def get(self):
+        """Take the next task, blocks while the scheduler is empty"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._size > 0)
+            return self._pop()
+
+    def drain(self):
+        """Remove and return all queued file tasks, control tasks stay queued"""
+        with self._cond:
+            tasks = [entry[2] for heap in self._heaps.values() for entry in sorted(heap)]
+            self._heaps.clear()
+            self._rotation.clear()
+            self._size = len(self._control)
+            return tasks
+
+    def qsize(self):
+        with self._cond:
+            return self._size
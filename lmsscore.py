@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+## Dateiname: lmsscore.py (Bewertung der Änderungen)
+# Zeilen-Hashes + Myers-Diff statt difflib, große Dateien per Stichprobe, Prozesspool gegen den GIL
+#
+import os
+import math
+import logging
+from collections import Counter
+from concurrent.futures import Future, ProcessPoolExecutor
+
+# Obergrenze der Änderungen für den exakten Diff (Myers ist O((N+M)·D))
+MAX_EDITS = 1000
+# Ab dieser Zeilenzahl (beide Seiten) wird nur eine Stichprobe bewertet
+SAMPLE_LINES = 50000
+
+def _myers(a, b, max_edits):
+    """Shortest edit script of two hash sequences, None if it exceeds max_edits"""
+    n, m = len(a), len(b)
+    v = {1: 0}
+    trace = []
+    for d in range(min(n + m, max_edits) + 1):
+        trace.append(dict(v))
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[k - 1] < v[k + 1]):
+                x = v[k + 1]
+            else:
+                x = v[k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[k] = x
+            if x >= n and y >= m:
+                return _backtrack(trace, n, m)
+    return None
+
+def _backtrack(trace, x, y):
+    """Edit operations ('-', index in a) / ('+', index in b) in file order"""
+    ops = []
+    for d in range(len(trace) - 1, 0, -1):
+        v = trace[d]
+        k = x - y
+        inserted = k == -d or (k != d and v[k - 1] < v[k + 1])
+        prev_k = k + 1 if inserted else k - 1
+        prev_x = v[prev_k]
+        prev_y = prev_x - prev_k
+        # Schritt nach unten = Zeile eingefügt, nach rechts = Zeile entfernt;
+        # gleiche Zeilen (Diagonale) dazwischen fallen beim Sprung weg
+        ops.append(('+', prev_y) if inserted else ('-', prev_x))
+        x, y = prev_x, prev_y
+    ops.reverse()
+    return ops
+
+def _score(added_comments, removed, changed):
+    # Wie bisher zählt die Kopfzeile '--- original' des Unified-Diffs als entfernte Zeile,
+    # damit neue Bewertungen mit der gespeicherten Historie vergleichbar bleiben
+    return added_comments - (removed + (1 if changed else 0)) * 10
+
+def _multiset_counts(old_lines, new_lines):
+    """Order-insensitive line counts in one linear pass, plus the number of differing lines"""
+    old = Counter(old_lines)
+    new = Counter(new_lines)
+    added = new - old
+    removed = old - new
+    return (
+        sum(count for line, count in added.items() if '#' in line),
+        sum(count for line, count in removed.items() if not line.startswith('#')),
+        sum(added.values()) + sum(removed.values())
+    )
+
+def score_texts(original, processed):
+    """Score a rewrite: +1 per added comment line, -10 per removed code line"""
+    a_lines = original.splitlines()
+    b_lines = processed.splitlines()
+
+    # Gemeinsamen Anfang und Ende abschneiden, das verkleinert den Diff stark
+    start = 0
+    limit = min(len(a_lines), len(b_lines))
+    while start < limit and a_lines[start] == b_lines[start]:
+        start += 1
+    end = 0
+    while end < limit - start and a_lines[-1 - end] == b_lines[-1 - end]:
+        end += 1
+    a_mid = a_lines[start:len(a_lines) - end]
+    b_mid = b_lines[start:len(b_lines) - end]
+    changed = bool(a_mid or b_mid)
+
+    result = {'method': 'myers', 'sampled': False, 'diff': []}
+    total = len(a_mid) + len(b_mid)
+    if total > SAMPLE_LINES:
+        # Stichprobe über den Zeilen-Hash: beide Seiten wählen dieselben Zeilen
+        stride = math.ceil(total / SAMPLE_LINES)
+        a_sample = [line for line in a_mid if hash(line) % stride == 0]
+        b_sample = [line for line in b_mid if hash(line) % stride == 0]
+        added_comments, removed, _ = _multiset_counts(a_sample, b_sample)
+        added_comments *= stride
+        removed *= stride
+        result.update(method='sampled', sampled=True)
+    else:
+        # Die Mengendifferenz ist eine untere Schranke für die Zahl der Änderungen:
+        # komplett umgeschriebene Dateien gar nicht erst an Myers geben
+        added_comments, removed, distance = _multiset_counts(a_mid, b_mid)
+        ops = None
+        if distance <= MAX_EDITS:
+            ops = _myers([hash(line) for line in a_mid], [hash(line) for line in b_mid], MAX_EDITS)
+        if ops is None:
+            # Zu viele Änderungen für den exakten Diff
+            result['method'] = 'multiset'
+        else:
+            added_comments = 0
+            removed = 0
+            diff = ['--- original', '+++ processed'] if ops else []
+            # Alle Zählungen in einem Durchlauf über die Änderungen
+            for op, index in ops:
+                if op == '+':
+                    line = b_mid[index]
+                    if '#' in line:
+                        added_comments += 1
+                else:
+                    line = a_mid[index]
+                    if not line.startswith('#'):
+                        removed += 1
+                diff.append(op + line)
+            result['diff'] = diff
+
+    result.update(
+        added_comments=added_comments,
+        removed=removed,
+        score=_score(added_comments, removed, changed)
+    )
+    return result
+
+
+class LMSScorer:
+    """Scores small results inline and large ones in a process pool"""
+
+    # Unterhalb dieser Größe kostet die Übergabe an einen Prozess mehr als die Bewertung
+    INLINE_BYTES = 256 * 1024
+
+    def __init__(self, max_processes=None):
+        self.max_processes = max_processes or min(4, os.cpu_count() or 1)
+        self._pool = None
+
+    def submit(self, original, processed):
+        """Return a Future with the score_texts() result"""
+        if len(original) + len(processed) < self.INLINE_BYTES:
+            future = Future()
+            try:
+                future.set_result(score_texts(original, processed))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_processes)
+            logging.info(f"Scoring pool started with {self.max_processes} processes")
+        return self._pool.submit(score_texts, original, processed)
+
+    def stop(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
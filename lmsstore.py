@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+## Dateiname: lmsstore.py (Evolutionsdaten)
+# SQLite-Ablage der Analysen: indiziert, Prompts nur einmal gespeichert, Diffs komprimiert
+#
+import json
+import zlib
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from datetime import datetime
+from lmsmanifest import LMSManifest
+
+class LMSEvolutionStore:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS prompts (
+            hash TEXT PRIMARY KEY,
+            positive TEXT NOT NULL,
+            negative TEXT NOT NULL,
+            created TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS analyses (
+            id INTEGER PRIMARY KEY,
+            file TEXT NOT NULL,
+            prompt_hash TEXT REFERENCES prompts(hash),
+            timestamp TEXT NOT NULL,
+            score INTEGER NOT NULL,
+            diff BLOB,
+            added INTEGER,
+            removed INTEGER,
+            method TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_analyses_file ON analyses(file);
+        CREATE INDEX IF NOT EXISTS idx_analyses_prompt ON analyses(prompt_hash);
+        CREATE INDEX IF NOT EXISTS idx_analyses_timestamp ON analyses(timestamp);
+        CREATE INDEX IF NOT EXISTS idx_analyses_score ON analyses(score);
+        CREATE TABLE IF NOT EXISTS optimizations (
+            id INTEGER PRIMARY KEY,
+            parent_hash TEXT REFERENCES prompts(hash),
+            prompt_hash TEXT NOT NULL REFERENCES prompts(hash),
+            name TEXT,
+            timestamp TEXT NOT NULL,
+            analyses INTEGER,
+            mean_score REAL,
+            report TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_optimizations_prompt ON optimizations(prompt_hash);
+    """
+
+    def __init__(self, data_dir="evolution_data", name="evolution.db"):
+        self.data_dir = Path(data_dir)
+        self.data_dir.mkdir(exist_ok=True)
+        self.path = self.data_dir / name
+        is_new = not self.path.exists()
+        # Eine Verbindung für alle Worker-Threads, Zugriffe über die Sperre serialisiert
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            # WAL: Schreiben ist ein Anhängen ohne fsync pro Commit
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(self.SCHEMA)
+        self._known_prompts = set()
+        if is_new:
+            self.import_legacy(self.data_dir)
+
+    def _store_prompt(self, prompt):
+        # Aufruf nur mit gehaltener Sperre
+        prompt = prompt or {}
+        prompt_hash = LMSManifest.prompt_hash(prompt)
+        if prompt_hash not in self._known_prompts:
+            self._db.execute(
+                "INSERT OR IGNORE INTO prompts (hash, positive, negative, created) VALUES (?, ?, ?, ?)",
+                (prompt_hash, str(prompt.get('positive', '')), str(prompt.get('negative', '')),
+                 datetime.now().isoformat())
+            )
+            self._known_prompts.add(prompt_hash)
+        return prompt_hash
+
+    @staticmethod
+    def _pack_diff(diff):
+        if not diff:
+            return None
+        return zlib.compress("\n".join(diff).encode('utf-8'))
+
+    @staticmethod
+    def _unpack_diff(blob):
+        if not blob:
+            return []
+        return zlib.decompress(blob).decode('utf-8').split("\n")
+
+    def record(self, file_path, score, prompt, diff=None, timestamp=None,
+               added=None, removed=None, method=None):
+        """Append one analysis, returns the prompt hash it was stored under"""
+        # added/removed: gezählte Kommentar- bzw. Codezeilen, method: Bewertungsweg
+        # ('myers', 'multiset' oder 'sampled', nur 'myers' liefert einen Diff)
+        with self._lock:
+            prompt_hash = self._store_prompt(prompt)
+            self._db.execute(
+                "INSERT INTO analyses (file, prompt_hash, timestamp, score, diff, added, removed, method) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (str(file_path), prompt_hash, timestamp or datetime.now().isoformat(),
+                 int(score), self._pack_diff(diff), added, removed, method)
+            )
+            self._db.commit()
+        return prompt_hash
+
+    def history(self, file_path=None, prompt_hash=None, since=None, until=None,
+                min_score=None, max_score=None, limit=100, with_diff=False, lowest_first=False):
+        """Query analyses, newest (or lowest scoring) first, every filter column is indexed"""
+        conditions = []
+        params = []
+        for column, op, value in (
+            ("file", "=", str(file_path) if file_path is not None else None),
+            ("prompt_hash", "=", prompt_hash),
+            ("timestamp", ">=", since),
+            ("timestamp", "<", until),
+            ("score", ">=", min_score),
+            ("score", "<=", max_score)
+        ):
+            if value is not None:
+                conditions.append(f"{column} {op} ?")
+                params.append(value)
+        columns = "id, file, prompt_hash, timestamp, score, added, removed, method" + (
+            ", diff" if with_diff else ""
+        )
+        query = f"SELECT {columns} FROM analyses"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY score ASC, timestamp DESC" if lowest_first else " ORDER BY timestamp DESC"
+        if limit:
+            query += f" LIMIT {int(limit)}"
+
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        results = []
+        for row in rows:
+            entry = dict(row)
+            if with_diff:
+                entry['diff'] = self._unpack_diff(entry['diff'])
+            results.append(entry)
+        return results
+
+    def prompt(self, prompt_hash):
+        """Prompt text stored under a hash"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT positive, negative FROM prompts WHERE hash = ?", (prompt_hash,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def prompt_stats(self):
+        """Number of analyses and average score per prompt"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT prompt_hash, COUNT(*) AS count, AVG(score) AS mean_score, "
+                "MIN(timestamp) AS first, MAX(timestamp) AS last "
+                "FROM analyses GROUP BY prompt_hash ORDER BY last DESC"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def record_optimization(self, parent, prompt, name, report):
+        """Remember that prompt was derived from parent and why"""
+        with self._lock:
+            parent_hash = self._store_prompt(parent)
+            prompt_hash = self._store_prompt(prompt)
+            self._db.execute(
+                "INSERT INTO optimizations (parent_hash, prompt_hash, name, timestamp, analyses, "
+                "mean_score, report) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (parent_hash, prompt_hash, name, datetime.now().isoformat(), report.get('count'),
+                 report.get('mean'), json.dumps(report, ensure_ascii=False))
+            )
+            self._db.commit()
+        return prompt_hash
+
+    def lineage(self, prompt_hash):
+        """Versions from prompt_hash back to its first ancestor, with their scores so far"""
+        versions = []
+        seen = set()
+        with self._lock:
+            while prompt_hash and prompt_hash not in seen:
+                seen.add(prompt_hash)
+                stats = self._db.execute(
+                    "SELECT COUNT(*) AS count, AVG(score) AS mean_score FROM analyses WHERE prompt_hash = ?",
+                    (prompt_hash,)
+                ).fetchone()
+                origin = self._db.execute(
+                    "SELECT parent_hash, name, timestamp FROM optimizations WHERE prompt_hash = ? "
+                    "ORDER BY timestamp DESC LIMIT 1", (prompt_hash,)
+                ).fetchone()
+                versions.append({
+                    'prompt_hash': prompt_hash,
+                    'name': origin['name'] if origin else None,
+                    'created': origin['timestamp'] if origin else None,
+                    'parent_hash': origin['parent_hash'] if origin else None,
+                    'count': stats['count'],
+                    'mean_score': stats['mean_score']
+                })
+                prompt_hash = origin['parent_hash'] if origin else None
+        return versions
+
+    def import_legacy(self, directory):
+        """Import analysis_*.json files written by older versions"""
+        files = sorted(Path(directory).glob("analysis_*.json"))
+        if not files:
+            return 0
+        imported = 0
+        for path in files:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                with self._lock:
+                    prompt_hash = self._store_prompt(data.get('prompt'))
+                    self._db.execute(
+                        "INSERT INTO analyses (file, prompt_hash, timestamp, score, diff) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (data['file'], prompt_hash, data['timestamp'], int(data['score']),
+                         self._pack_diff(data.get('diff')))
+                    )
+                imported += 1
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logging.warning(f"Skipping legacy analysis {path}: {str(e)}")
+        with self._lock:
+            self._db.commit()
+        logging.info(f"Imported {imported} legacy analyses into {self.path}")
+        return imported
+
+    def close(self):
+        with self._lock:
+            self._db.close()
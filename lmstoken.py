@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+## Dateiname: lmstoken.py (Token-Zählung)
+# Schätzt die Anfragegröße vor dem Versand, mit tiktoken falls verfügbar
+#
+import logging
+import threading
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+class LMSTokenCounter:
+    # Lokale Modelle haben eigene Tokenizer, cl100k_base ist eine gute Näherung
+    ENCODING = "cl100k_base"
+    # Zusätzliche Tokens pro Chat-Nachricht (Rolle, Trennzeichen)
+    MESSAGE_OVERHEAD = 4
+
+    def __init__(self, encoding=None):
+        self.encoding_name = encoding or self.ENCODING
+        self._encoding = None
+        self._encoding_loaded = False
+        self._lock = threading.Lock()
+        self._memo = {}  # file_path -> (content hash, token count)
+
+    def _get_encoding(self):
+        """Load tiktoken encoding on first use"""
+        with self._lock:
+            if not self._encoding_loaded:
+                self._encoding_loaded = True
+                if tiktoken is None:
+                    logging.info("tiktoken not installed, using token estimate")
+                else:
+                    try:
+                        self._encoding = tiktoken.get_encoding(self.encoding_name)
+                    except Exception as e:
+                        logging.warning(f"tiktoken unavailable, using token estimate: {str(e)}")
+            return self._encoding
+
+    @staticmethod
+    def estimate(length):
+        """Cheap estimate from a text length or file size (about four characters per token)"""
+        return length // 4 + 1
+
+    def count(self, text):
+        """Count tokens of a text"""
+        encoding = self._get_encoding()
+        if encoding is None:
+            return self.estimate(len(text))
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def count_content(self, file_path, content):
+        """Count tokens of a file's content, memoized per file"""
+        key = str(file_path)
+        content_hash = hash(content)
+        cached = self._memo.get(key)
+        if cached and cached[0] == content_hash:
+            return cached[1]
+        tokens = self.count(content)
+        self._memo[key] = (content_hash, tokens)
+        return tokens
+
+    def count_messages(self, messages):
+        """Count tokens of a chat message list"""
+        return sum(
+            self.count(str(message.get('content', ''))) + self.MESSAGE_OVERHEAD
+            for message in messages
+        )
@@ -5,20 +5,32 @@
 #
 # Autor: [Dein Name]
 
+import os
 import json
 import logging
 import threading
+import time
 from queue import Queue
 from pathlib import Path
-from lmsgui import LMSGUI
 from lmsfile import LMSFileHandler
 from lmsgit import LMSGitHandler
 from lmsprompt import LMSPromptManager
 from lmsapi import LMSAPIHandler
 from lmevolution import LMEvolution
+from lmsmanifest import LMSManifest
+from lmswriter import LMSWriter
+from lmsjobs import LMSJobTracker
+from lmsjournal import LMSJournal
+from lmsmetrics import LMSMetrics
 
 class LMStudioPlugin:
-    def __init__(self):
+    def __init__(self, reporter=None, max_workers=None, connect_timeout=None, read_timeout=None):
+        # Ohne Reporter wird die Tkinter-Oberfläche gestartet (siehe lmscli.py für Batch-Läufe)
+        self.reporter = reporter
+        self.max_workers = max_workers
+        # Timeouts in Sekunden, None: Standardwerte von LMSAPIHandler
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
         self._init_logging()
         self._init_system()
         self._setup_components()
@@ -36,37 +48,90 @@ class LMStudioPlugin:
     def _init_system(self):
         """Initialize core variables"""
         self.running = True
-        self.processing_active = False
         self.current_prompt = None
-        self.current_processing_count = 0
-        self.total_files_to_process = 0
+        # Zustand jeder Datei des aktuellen Laufs, meldet das Ende ohne Polling
+        self.jobs = LMSJobTracker()
+        self.jobs.on_complete = self._on_run_complete
+        self.cancel_event = threading.Event()
+        # Journal des laufenden Laufs, erlaubt das Fortsetzen nach Abbruch/Absturz
+        self.resume = False
+        self.journal = None
         self.message_queue = Queue()
+        # Zeiten, Tokens und Bytes pro Datei (metrics/)
+        self.metrics = LMSMetrics()
+        # Inkrementeller Modus: nur neue/geänderte Dateien verarbeiten
+        self.incremental = False
+        self.manifest = None
+        self.prompt_hash = None
+        # Teilergebnisse laufender Streams, erst nach Abschluss auf die Platte
+        self.partial_results = {}
+        self._stream_lock = threading.Lock()
+        self._last_stream_status = 0.0
 
     def _setup_components(self):
         """Initialize all submodules"""
         self.file_handler = LMSFileHandler(self)
         self.git_handler = LMSGitHandler(self)
         self.prompt_manager = LMSPromptManager()
-        self.api_handler = LMSAPIHandler(self)
+        self.api_handler = LMSAPIHandler(
+            self, max_workers=self.max_workers,
+            connect_timeout=self.connect_timeout, read_timeout=self.read_timeout
+        )
         self.evolution = LMEvolution(self)
-        self.gui = LMSGUI(self)
+        self.writer = LMSWriter(self)
+        if self.reporter is not None:
+            self.gui = self.reporter
+        else:
+            from lmsgui import LMSGUI
+            self.gui = LMSGUI(self)
 
     def _start_services(self):
         """Start background services"""
-        threading.Thread(target=self._monitor_processing, daemon=True).start()
         logging.info("Background services started")
 
-    def _monitor_processing(self):
-        """Monitor processing progress"""
-        while self.running:
-            if self.processing_active:
-                if self.current_processing_count >= self.total_files_to_process:
-                    self.processing_active = False
-                    self.gui.show_completion_message()
-            threading.Event().wait(0.5)
+    @property
+    def processing_active(self):
+        return self.jobs.active
+
+    def _on_run_complete(self):
+        """Called by the job tracker as soon as the last file is final"""
+        # Zustand dieses Laufs jetzt festhalten: ein neuer Lauf kann beginnen,
+        # während der Abschluss noch auf den Writer wartet
+        run = {
+            'journal': self.journal,
+            'manifest': self.manifest,
+            'summary': self.jobs.summary(),
+            'states': self.jobs.file_states(),
+            'cancelled': self.cancel_event.is_set()
+        }
+        # Eigener Thread: der Aufrufer kann der Writer-Thread selbst sein
+        threading.Thread(target=self._finish_run, args=(run,), daemon=True).start()
+
+    def _finish_run(self, run):
+        output = self.writer.finish_run()
+        if output:
+            self.gui.update_status(f"Run output: {output}")
+        if run['manifest']:
+            run['manifest'].save()
+        summary = run['summary']
+        cancelled = run['cancelled']
+        metrics = self.metrics.export(run['states'])
+        self.gui.show_summary(self.metrics.table(metrics), metrics)
+        self.evolution.finish_run()
+        if run['journal']:
+            run['journal'].finish(summary, cancelled)
+        stats = self.api_handler.cache.stats()
+        logging.info(
+            f"Run {'cancelled' if cancelled else 'finished'}: {summary['written']} written, "
+            f"{summary['failed']} failed, {summary['cancelled']} cancelled, "
+            f"{summary['cache_hits']} from cache of {summary['total']} files"
+        )
+        logging.info(f"Response cache: {stats['hits']} hits, {stats['misses']} misses")
+        self.gui.show_completion_message()
 
     def process_ai_response(self, response_data):
         """Process AI responses with proper JSON handling"""
+        applied = False
         try:
             # Wenn response_data bereits ein Dictionary ist
             if isinstance(response_data, dict):
@@ -81,16 +146,50 @@ class LMStudioPlugin:
             if not self._validate_response(data):
                 raise ValueError("Invalid AI response format")
                 
-            self._apply_changes(data['file_path'], data['processed'])
-            self.evolution.analyze_result(data)
+            self.discard_stream(data['file_path'])
+            self._apply_changes(data['file_path'], data['processed'], data['original'])
+            applied = True
+            # Analyse in eigener Stufe, blockiert den API-Worker nicht
+            self.evolution.submit(data)
             return True
             
         except Exception as e:
             error_msg = f"Processing failed: {str(e)}"
             self.gui.show_error(error_msg)
             logging.error(error_msg)
+            if not applied and isinstance(response_data, dict):
+                self.on_file_failed(response_data.get('file_path'))
             return False
 
+    def on_file_failed(self, file_path):
+        """Count a file that could not be processed so the run can finish"""
+        if file_path is not None:
+            self.discard_stream(file_path)
+            state = LMSJobTracker.CANCELLED if self.cancel_event.is_set() else LMSJobTracker.FAILED
+            self.jobs.set_state(file_path, state)
+            if self.journal:
+                self.journal.record(file_path, state)
+        self._update_progress()
+
+    def on_stream_progress(self, file_path, delta, token_count, elapsed):
+        """Buffer streamed tokens and show the live token rate"""
+        with self._stream_lock:
+            self.partial_results.setdefault(file_path, []).append(delta)
+            now = time.monotonic()
+            if now - self._last_stream_status < 0.25:
+                return
+            self._last_stream_status = now
+
+        rate = token_count / elapsed if elapsed > 0 else 0.0
+        self.gui.update_status(
+            f"Streaming {Path(file_path).name}: {token_count} tokens ({rate:.1f} tok/s)"
+        )
+
+    def discard_stream(self, file_path):
+        """Drop the partial buffer of a finished or failed stream"""
+        with self._stream_lock:
+            self.partial_results.pop(str(file_path), None)
+
     def _validate_response(self, data):
         """Validate response structure"""
         required = {'file_path', 'processed', 'original'}
@@ -101,27 +200,127 @@ class LMStudioPlugin:
         # Implementation remains unchanged from your requirements
         return True
 
-    def _apply_changes(self, file_path, content):
-        """Apply changes to files"""
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(content)
-        self.current_processing_count += 1
-        progress = (self.current_processing_count / self.total_files_to_process) * 100
-        self.gui.update_progress(progress)
-
-    def start_processing(self, file_list):
-        """Start batch processing"""
-        self.processing_active = True
-        self.total_files_to_process = len(file_list)
-        self.current_processing_count = 0
-        for file_path in file_list:
-            self.file_handler.process_file(file_path, self.current_prompt)
+    def _apply_changes(self, file_path, content, original=None):
+        """Hand changes to the writer (atomic write, patch or git output)"""
+        self.writer.submit(file_path, original, content)
+
+    def on_file_written(self, file_path, size, digest=None):
+        """Called by the writer once a result has been written"""
+        # Nur echte Änderungen auf der Platte im Manifest vermerken
+        if self.manifest and self.writer.mode == 'write':
+            self.manifest.record(file_path, self.prompt_hash)
+        # Vor dem Zustandswechsel, der letzte Wechsel beendet den Lauf
+        self.metrics.add(file_path, bytes_written=size)
+        self.jobs.set_state(file_path, LMSJobTracker.WRITTEN)
+        if self.journal:
+            self.journal.record(file_path, LMSJobTracker.WRITTEN, digest)
+        self._update_progress()
+
+    def _update_progress(self):
+        self.gui.update_progress(self.jobs.progress())
+
+    def start_processing(self, file_list, target=None, validated=False):
+        """Start batch processing, file_list may be a lazy directory walk (paths or (path, size))"""
+        self.manifest = LMSManifest(target) if target else None
+        self.prompt_hash = LMSManifest.prompt_hash(self.current_prompt)
+        self.cancel_event.clear()
+        self.jobs.start()
+        self.writer.start_run(target)
+        self.api_handler.start_run()
+        self.metrics.start_run()
+        self.evolution.start_run()
+
+        done = None
+        self.journal = LMSJournal(target) if target else None
+        if self.journal:
+            if self.resume and self.writer.mode != 'write':
+                # Patch und Commit entstehen erst am Laufende, 'written' ist dort nicht dauerhaft
+                self.gui.update_status("Resume requires output mode 'write', starting a new run")
+                logging.warning(f"Resume ignored for output mode '{self.writer.mode}'")
+            elif self.resume:
+                done = self.journal.resumable(self.prompt_hash)
+                if done is not None:
+                    self.gui.update_status(f"Resuming run: {len(done)} files already done")
+            self.journal.begin(self.prompt_hash, resume=done is not None, mode=self.writer.mode)
+
+        queued = 0
+        skipped = 0
+        content_tokens = 0
+        # Dateien sofort einreihen, während das Verzeichnis noch durchsucht wird
+        for item in file_list:
+            if self.cancel_event.is_set():
+                break
+            # walk(with_size=True) liefert die Größe gleich mit
+            file_path, size = item if isinstance(item, tuple) else (item, None)
+            if done and os.path.abspath(file_path) in done:
+                skipped += 1
+                continue
+            if (self.incremental and self.manifest
+                    and not self.manifest.needs_processing(file_path, self.prompt_hash)):
+                skipped += 1
+                continue
+            # Nur grob schätzen, genau gezählt wird erst beim Planen der Anfrage
+            if size is None:
+                try:
+                    size = os.path.getsize(file_path)
+                except OSError:
+                    size = 0
+            tokens = self.api_handler.tokens.estimate(size)
+            content_tokens += tokens
+            # Vor dem Einreihen registrieren, die Datei kann sofort fertig werden
+            self.jobs.add(file_path)
+            if self.file_handler.process_file(file_path, self.current_prompt, validated,
+                                              cost=tokens, group=self._schedule_group(file_path, target)):
+                queued += 1
+                if self.journal:
+                    self.journal.record(file_path, LMSJobTracker.QUEUED)
+            else:
+                self.jobs.discard(file_path)
+            if self.cancel_event.is_set():
+                # Abbruch kann die Warteschlange geleert haben, bevor diese Datei eingereiht war
+                self.file_handler.cancel()
+                break
+
+        if self.incremental:
+            logging.info(f"Incremental run: skipped {skipped} unchanged files")
+        prompt_tokens, total_tokens = self.api_handler.estimate_batch(
+            queued, content_tokens, self.current_prompt
+        )
+        self.gui.update_status(
+            f"Queued {queued} files ({skipped} skipped), "
+            f"~{prompt_tokens} prompt tokens (~{total_tokens} total) expected"
+        )
+        self.jobs.close()
+
+    def _schedule_group(self, file_path, target):
+        """Fairness group of a file: the top-level directory below the target"""
+        if not target:
+            return None
+        try:
+            parts = Path(file_path).resolve().relative_to(Path(target).resolve()).parts
+        except ValueError:
+            return None
+        return parts[0] if len(parts) > 1 else None
+
+    def stop_processing(self):
+        """Cancel the current run: purge queues, abort streams, mark pending files"""
+        if not self.jobs.active:
+            return
+        self.cancel_event.set()
+        self.file_handler.cancel()
+        self.api_handler.cancel()
+        self.jobs.cancel()
+        self.gui.update_status("Processing cancelled")
+        logging.info("Processing cancelled by user")
 
     def stop(self):
         """Safe shutdown"""
         self.running = False
+        self.stop_processing()
         self.file_handler.stop()
         self.api_handler.stop()
+        self.writer.stop()
+        self.evolution.stop()
         self.git_handler.stop()
         logging.info("Application stopped")
 
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+## Dateiname: lmswriter.py (Ausgabe der Ergebnisse)
+# Schreibt Ergebnisse atomar und gebündelt zurück oder sammelt sie als Patch / Git-Commit
+#
+import os
+import queue
+import hashlib
+import difflib
+import logging
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from datetime import datetime
+
+class LMSWriter:
+    # write: Dateien ersetzen, patch: eine Patch-Datei, git: Commit auf eigenem Branch
+    MODES = ('write', 'patch', 'git')
+    BATCH_SIZE = 32
+
+    def __init__(self, plugin):
+        self.plugin = plugin
+        self.mode = 'write'
+        self.fsync = True
+        self.patch_dir = Path("patches")
+        self.write_queue = queue.Queue()
+        self.running = True
+        self._reset_run(None)
+        self.worker = threading.Thread(target=self._process_writes)
+        self.worker.start()
+        logging.info("Writer initialized")
+
+    def _reset_run(self, target):
+        self.run_root = Path(target).resolve() if target else Path.cwd()
+        if self.run_root.is_file():
+            self.run_root = self.run_root.parent
+        self.run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.output = None
+        self._patch_file = None
+        self._git_root = None
+        self._git_blobs = []
+
+    def start_run(self, target):
+        """Prepare output for a new run"""
+        self.write_queue.put({'action': 'start', 'target': target})
+
+    def submit(self, file_path, original, processed):
+        """Queue processed content for output"""
+        self.write_queue.put({
+            'action': 'write',
+            'path': str(file_path),
+            'original': original,
+            'processed': processed
+        })
+
+    def finish_run(self):
+        """Flush pending output and return the patch file or commit of this run"""
+        done = threading.Event()
+        result = {}
+        self.write_queue.put({'action': 'finish', 'done': done, 'result': result})
+        done.wait()
+        return result.get('output')
+
+    def _process_writes(self):
+        """Process write tasks, bundling consecutive writes"""
+        while self.running:
+            tasks = [self.write_queue.get()]
+            while len(tasks) < self.BATCH_SIZE:
+                try:
+                    tasks.append(self.write_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            writes = []
+            for task in tasks:
+                if task['action'] == 'write':
+                    writes.append(task)
+                    continue
+                self._flush(writes)
+                writes = []
+                try:
+                    if task['action'] == 'start':
+                        self._reset_run(task['target'])
+                    elif task['action'] == 'finish':
+                        task['result']['output'] = self._finish()
+                except Exception as e:
+                    logging.error(f"Writer task '{task['action']}' failed: {str(e)}")
+                finally:
+                    # Sonst wartet finish_run() für immer
+                    if task['action'] == 'finish':
+                        task['done'].set()
+            self._flush(writes)
+
+            for _ in tasks:
+                self.write_queue.task_done()
+
+    def _flush(self, writes):
+        if not writes:
+            return
+        handler = {
+            'write': self._write_files,
+            'patch': self._write_patch,
+            'git': self._write_blobs
+        }.get(self.mode, self._write_files)
+        try:
+            for task, size in handler(writes):
+                task['done'] = True
+                digest = hashlib.sha256(task['processed'].encode('utf-8')).hexdigest()
+                self.plugin.on_file_written(task['path'], size, digest)
+        except Exception as e:
+            # Unerwartete Fehler dürfen den Writer-Thread nicht beenden
+            for task in writes:
+                if not task.get('done'):
+                    self._fail(task, f"Output failed: {task['path']} - {str(e)}")
+
+    def _write_files(self, writes):
+        """Write via temp file + os.replace, one fsync round per batch"""
+        staged = []
+        for task in writes:
+            path = Path(task['path'])
+            fd = temp = f = None
+            try:
+                fd, temp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".lmstmp", dir=path.parent)
+                f = os.fdopen(fd, 'w', encoding='utf-8')
+                f.write(task['processed'])
+                f.flush()
+                staged.append((task, path, temp, f))
+            except (OSError, ValueError) as e:
+                # Keine halb geschriebene Temporärdatei im Quellbaum zurücklassen
+                self._discard(f, fd, temp)
+                self._fail(task, f"Write failed: {task['path']} - {str(e)}")
+
+        # Erst alle Daten schreiben, dann gemeinsam synchronisieren
+        directories = set()
+        for task, path, temp, f in staged:
+            try:
+                if self.fsync:
+                    os.fsync(f.fileno())
+                f.close()
+                if path.exists():
+                    os.chmod(temp, path.stat().st_mode)
+                os.replace(temp, path)
+                directories.add(path.parent)
+                yield task, path.stat().st_size
+            except OSError as e:
+                self._discard(f, None, temp)
+                self._fail(task, f"Write failed: {task['path']} - {str(e)}")
+
+        if self.fsync and hasattr(os, 'O_DIRECTORY'):
+            for directory in directories:
+                try:
+                    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+                    try:
+                        os.fsync(fd)
+                    finally:
+                        os.close(fd)
+                except OSError:
+                    pass
+
+    @staticmethod
+    def _discard(f, fd, temp):
+        """Close and remove a temp file after a failed write"""
+        try:
+            if f is not None:
+                f.close()
+            elif fd is not None:
+                os.close(fd)
+        except (OSError, ValueError):
+            pass
+        if temp:
+            Path(temp).unlink(missing_ok=True)
+
+    def _relative(self, file_path):
+        path = Path(file_path).resolve()
+        try:
+            return path.relative_to(self.run_root).as_posix()
+        except ValueError:
+            return path.as_posix()
+
+    def _write_patch(self, writes):
+        """Append unified diffs to the patch file of this run"""
+        if self._patch_file is None:
+            self.patch_dir.mkdir(exist_ok=True)
+            self.output = self.patch_dir / f"run_{self.run_id}.patch"
+            self._patch_file = open(self.output, 'w', encoding='utf-8', newline='\n')
+
+        for task in writes:
+            try:
+                original = task['original']
+                if original is None:
+                    original = Path(task['path']).read_text(encoding='utf-8')
+                name = self._relative(task['path'])
+                diff = ''.join(
+                    line if line.endswith('\n') else f"{line}\n\\ No newline at end of file\n"
+                    for line in difflib.unified_diff(
+                        original.splitlines(keepends=True),
+                        task['processed'].splitlines(keepends=True),
+                        fromfile=f"a/{name}",
+                        tofile=f"b/{name}"
+                    )
+                )
+                self._patch_file.write(diff)
+            except (OSError, ValueError) as e:
+                self._fail(task, f"Patch failed: {task['path']} - {str(e)}")
+                continue
+            yield task, len(diff.encode('utf-8'))
+        self._patch_file.flush()
+
+    def _git(self, *args, input=None, env=None):
+        return subprocess.run(
+            ["git", "-C", str(self._git_root or self.run_root), *args],
+            input=input,
+            capture_output=True,
+            check=True,
+            env=env
+        ).stdout.decode('utf-8').strip()
+
+    @staticmethod
+    def _error_text(e):
+        """Error message including git's own explanation (stderr)"""
+        stderr = getattr(e, 'stderr', None)
+        if stderr:
+            return f"{str(e).rstrip('.')}: {stderr.decode('utf-8', errors='replace').strip()}"
+        return str(e)
+
+    def _write_blobs(self, writes):
+        """Store results as git blobs, the commit is created in _finish"""
+        if self._git_root is None:
+            try:
+                self._git_root = Path(self._git("rev-parse", "--show-toplevel"))
+            except (OSError, subprocess.CalledProcessError) as e:
+                for task in writes:
+                    self._fail(task, f"Git output requires a repository: {self._error_text(e)}")
+                return
+
+        for task in writes:
+            try:
+                data = task['processed'].encode('utf-8')
+                sha = self._git("hash-object", "-w", "--stdin", input=data)
+                rel = Path(task['path']).resolve().relative_to(self._git_root).as_posix()
+                self._git_blobs.append((rel, sha))
+                yield task, len(data)
+            except (OSError, ValueError, subprocess.CalledProcessError) as e:
+                self._fail(task, f"Git blob failed: {task['path']} - {self._error_text(e)}")
+
+    def _commit_blobs(self):
+        """Commit all blobs of this run on a branch without touching the working tree"""
+        modes = {}
+        for line in self._git("ls-files", "-s", "--", *[rel for rel, _ in self._git_blobs]).splitlines():
+            info, rel = line.split('\t', 1)
+            modes[rel] = info.split()[0]
+
+        index = tempfile.NamedTemporaryFile(prefix="lmsindex", delete=False)
+        index.close()
+        env = dict(os.environ, GIT_INDEX_FILE=index.name)
+        try:
+            self._git("read-tree", "HEAD", env=env)
+            for rel, sha in self._git_blobs:
+                self._git("update-index", "--add", "--cacheinfo",
+                          f"{modes.get(rel, '100644')},{sha},{rel}", env=env)
+            tree = self._git("write-tree", env=env)
+            commit = self._git(
+                "commit-tree", tree, "-p", "HEAD",
+                "-m", f"LM Studio run {self.run_id} ({len(self._git_blobs)} files)"
+            )
+            branch = f"lmstudio/run-{self.run_id}"
+            self._git("update-ref", f"refs/heads/{branch}", commit)
+            return f"{branch} ({commit[:10]})"
+        finally:
+            os.unlink(index.name)
+
+    def _finish(self):
+        """Close patch file or create the git commit of this run"""
+        try:
+            if self._patch_file is not None:
+                self._patch_file.close()
+                self._patch_file = None
+            elif self._git_blobs:
+                self.output = self._commit_blobs()
+                self._git_blobs = []
+        except (OSError, subprocess.CalledProcessError) as e:
+            error_msg = f"Finishing output failed: {self._error_text(e)}"
+            self.plugin.gui.show_error(error_msg)
+            logging.error(error_msg)
+        if self.output:
+            logging.info(f"Run output: {self.output}")
+        return self.output
+
+    def _fail(self, task, error_msg):
+        task['done'] = True
+        self.plugin.gui.show_error(error_msg)
+        logging.error(error_msg)
+        self.plugin.on_file_failed(task['path'])
+
+    def stop(self):
+        """Stop writer"""
+        self.running = False
+        self.write_queue.put({'action': 'shutdown'})
+        self.worker.join()
+        logging.info("Writer stopped")